@@ -2,13 +2,20 @@
 Action executor module.
 Executes browser actions based on task requirements.
 """
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from playwright.async_api import Page, Locator
 from logger import logger
 from disambiguation_layer import DisambiguationLayer
 import asyncio
 
 
+async def _attrs(loc: Locator, names: List[str]) -> Dict[str, Optional[str]]:
+    """Несколько атрибутов элемента одним evaluate вместо get_attribute на каждый"""
+    return await loc.evaluate(
+        "(e, ns) => Object.fromEntries(ns.map(n => [n, e.getAttribute(n)]))", names
+    )
+
+
 class ActionExecutor:
     """Executes browser actions"""
 
@@ -381,10 +388,11 @@ class ActionExecutor:
                 all_locators = await locator.all()
                 for i, loc in enumerate(all_locators[:5]):
                     try:
-                        placeholder = await loc.get_attribute("placeholder")
+                        attrs = await _attrs(loc, ["placeholder", "id"])
+                        placeholder = attrs["placeholder"]
                         label_text = "unknown"
                         try:
-                            loc_id = await loc.get_attribute("id")
+                            loc_id = attrs["id"]
                             if loc_id:
                                 # Используем evaluate вместо .locator() для поиска связанного label
                                 label_el = await self.page.evaluate(f"""
@@ -9,7 +9,7 @@ from config_loader import config
 from page_analyzer import PageAnalyzer, PageAnalysis
 from action_executor import ActionExecutor
 from task_analyzer import TaskAnalyzer, Task
-from decision_validator import DecisionValidator
+from decision_validator import parse_decision
 from logger import logger
 import asyncio
 import json
@@ -106,6 +106,7 @@ class BrowserAgent:
                 await self.context.close()
             if self.browser:
                 await self.browser.close()
+            await self.api.aclose()
             logger.success("Агент остановлен")
         except Exception as e:
             logger.error(f"Ошибка при остановке: {str(e)}")
@@ -458,7 +459,7 @@ class BrowserAgent:
                     return None
                 
                 # Validate URL format
-                if url.startswith("http://") or url.startswith("https://"):
+                if url.startswith(("http://", "https://")):
                     logger.success(f"✅ Стартовый URL: {url}")
                     return url
                 elif "." in url:
@@ -654,7 +655,7 @@ class BrowserAgent:
                     return None
                 
                 # Validate URL
-                if url.startswith("http://") or url.startswith("https://"):
+                if url.startswith(("http://", "https://")):
                     logger.success(f"✅ Переходу на сайт: {url}")
                     return url
                 elif "." in url:
@@ -864,7 +865,7 @@ class BrowserAgent:
                     
                     # 📝 ЗАПИСЬ ДЕЙСТВИЯ В ИСТОРИЮ (успешного или нет)
                     try:
-                        parsed_decision = DecisionValidator.parse_decision(decision)
+                        parsed_decision = parse_decision(decision)
                         if parsed_decision[0]:  # is_valid
                             decision_obj = parsed_decision[1]
                             self.failed_actions.append({
@@ -1569,7 +1570,7 @@ URL: {page_analysis.url}
         - Handle strict_mode_violation by asking LLM for disambiguation
         """
         # ========== PARSE DECISION (STRICT JSON) ==========
-        is_valid, parsed, parse_error = DecisionValidator.parse_decision(decision)
+        is_valid, parsed, parse_error = parse_decision(decision)
         if not is_valid:
             logger.error(f"❌ Ошибка парсинга решения: {parse_error}")
             logger.error(f"Исходное решение:\n{decision[:200]}")
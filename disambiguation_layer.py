@@ -18,9 +18,54 @@ import asyncio
 import re
 
 
+# Видимость как у Playwright (visible=true): непустой bounding box и не visibility:hidden
+_VISIBLE_COUNTS_JS = """
+    (els) => ({
+        total: els.length,
+        visible: els.filter(e => {
+            const r = e.getBoundingClientRect();
+            return r.width > 0 && r.height > 0 && getComputedStyle(e).visibility !== 'hidden';
+        }).length
+    })
+"""
+
+# Индекс первого (из первых 5) элемента целиком внутри viewport, иначе -1
+_FIRST_IN_VIEWPORT_JS = """
+    (els) => {
+        const w = window.innerWidth, h = window.innerHeight;
+        return els.slice(0, 5).findIndex(e => {
+            const r = e.getBoundingClientRect();
+            return r.width > 0 && r.height > 0
+                && r.top >= 0 && r.left >= 0 && r.bottom <= h && r.right <= w;
+        });
+    }
+"""
+
+
+# Сколько кандидатов лежит внутри каждого scope (строго потомки, как scope.locator(...))
+_SCOPED_COUNTS_JS = """
+    (els, sels) => ({
+        total: els.length,
+        counts: sels.map(sel => els.filter(e => e.parentElement && e.parentElement.closest(sel)).length)
+    })
+"""
+
+
 class DisambiguationLayer:
     """Smart narrowing для разрешения ambiguous locators"""
     
+    __slots__ = ("page", "narrowing_log")
+    
+    # Ключевые области для narrowing (порядок = приоритет)
+    SCOPES = [
+        ("main", "главную область контента"),
+        ("form", "форму"),
+        ("[role='search']", "зону поиска"),
+        ("[role='region']", "регион"),
+        (".modal", "модальное окно"),
+        (".sidebar", "боковую панель"),
+    ]
+    
     def __init__(self, page: Page):
         self.page = page
         self.narrowing_log = []
@@ -146,34 +191,31 @@ class DisambiguationLayer:
         """
         Ограничить область поиска (main, form, section и т.д.).
         """
-        # Ключевые области для narrowing
-        scopes = [
-            ("main", "главную область контента"),
-            ("form", "форму"),
-            ("[role='search']", "зону поиска"),
-            ("[role='region']", "регион"),
-            (".modal", "модальное окно"),
-            (".sidebar", "боковую панель"),
-        ]
-        
-        for scope_selector, scope_name in scopes:
-            try:
-                # Попробовать узко ограничить
-                scope_area = self.page.locator(scope_selector)
-                if await scope_area.count() > 0:
-                    narrowed = scope_area.locator(locator._selector if hasattr(locator, '_selector') else "")
-                    # Fallback - use the existing locator with filter
-                    # В Playwright это сложнее, использован будет фильтр по has()
-                    
-                    narrowed_count = await narrowed.count()
-                    if 0 < narrowed_count < await locator.count():
-                        return {
-                            "locator": narrowed,
-                            "count": narrowed_count,
-                            "reason": f"Сужена область до {scope_name}: {narrowed_count} элементов"
-                        }
-            except:
-                pass
+        # Все scope-пробы одним evaluate_all: кандидатов резолвит Playwright, сужение считается в браузере.
+        # Отсутствующий scope просто даст 0 - отдельная проверка наличия (и её кэш) не нужна:
+        # .modal / .sidebar появляются и исчезают без навигации
+        try:
+            result = await locator.evaluate_all(
+                _SCOPED_COUNTS_JS,
+                [scope_selector for scope_selector, _ in self.SCOPES]
+            )
+        except Exception:
+            return None
+        total_count = result["total"]
+        
+        inner_selector = locator._selector if hasattr(locator, '_selector') else ""
+        # Порядок scopes = приоритет: берём первое удачное сужение
+        for (scope_selector, scope_name), narrowed_count in zip(self.SCOPES, result["counts"]):
+            if 0 < narrowed_count < total_count:
+                try:
+                    narrowed = self.page.locator(scope_selector).locator(inner_selector)
+                except Exception:
+                    continue
+                return {
+                    "locator": narrowed,
+                    "count": narrowed_count,
+                    "reason": f"Сужена область до {scope_name}: {narrowed_count} элементов"
+                }
         
         return None
     
@@ -185,10 +227,12 @@ class DisambiguationLayer:
         Отфильтровать только видимые элементы.
         """
         try:
-            # Применить фильтр видимости
-            visible_locator = locator.filter(has=self.page.locator(":visible"))
-            visible_count = await visible_locator.count()
-            total_count = await locator.count()
+            # Фильтр видимости самих кандидатов (visible= движок, один проход; filter(visible=True) появился только в 1.51)
+            visible_locator = locator.locator("visible=true")
+            # Оба счётчика за один round-trip вместо двух count()
+            counts = await locator.evaluate_all(_VISIBLE_COUNTS_JS)
+            visible_count = counts["visible"]
+            total_count = counts["total"]
             
             if visible_count < total_count and visible_count > 0:
                 return {
@@ -233,10 +277,10 @@ class DisambiguationLayer:
         Получить первый элемент который находится в viewport.
         """
         try:
-            for i in range(min(5, await locator.count())):
-                elem = locator.nth(i)
-                if await elem.is_in_viewport():
-                    return elem.locator("..")  # Вернуть сам элемент
+            # Один evaluate_all вместо count() + is_in_viewport() на каждый из 5 элементов
+            idx = await locator.evaluate_all(_FIRST_IN_VIEWPORT_JS)
+            if idx >= 0:
+                return locator.nth(idx)
         except:
             pass
         
@@ -2,15 +2,45 @@
 Rich logging module with colors and emojis.
 Provides structured logging for all agent operations.
 """
+import os
 import sys
 import json
+import atexit
 import inspect
+import queue
 import threading
-from datetime import datetime
+import time
 from enum import Enum
-from colorama import Fore, Back, Style, init
 
-init(autoreset=True)
+# Цвета только для интерактивного терминала: при выводе в файл/пайп или NO_COLOR
+# colorama не импортируется, а все escape-последовательности - пустые строки
+_USE_COLOR = sys.stdout.isatty() and os.environ.get("NO_COLOR") is None
+
+if _USE_COLOR:
+    from colorama import Fore, Style, init
+    init(autoreset=True)
+else:
+    class _NoColor:
+        """Заглушка Fore/Style: любой атрибут - пустая строка"""
+        def __getattr__(self, name: str) -> str:
+            return ""
+
+    Fore = Style = _NoColor()
+
+# Precomputed ANSI fragments - format path only concatenates, never re-escapes
+_TS_OPEN = f"{Style.DIM}["
+_TS_CLOSE = f"]{Style.RESET_ALL} "
+_RESET = Style.RESET_ALL
+_INDENT_CACHE = ["  " * i for i in range(16)]
+
+# Интерактивные подсказки - константы, собираются один раз
+_ASK_MARK = f"{Fore.YELLOW}❓ "
+_ASK_PROMPT = f"{Fore.GREEN}> {Style.RESET_ALL}"
+_CONFIRM_MARK = f"{Fore.MAGENTA}🔒 "
+_CONFIRM_PROMPT = f"{Fore.YELLOW}[Y/N] > {Style.RESET_ALL}"
+_CONFIRM_YES = frozenset(("y", "yes"))
+_JSON_LEADS = frozenset("{[")
+_FLUSH_TIMEOUT = 2.0  # Сколько flush() ждёт writer-поток, секунд
 
 
 class LogLevel(Enum):
@@ -45,13 +75,26 @@ class LogLevelFilter(Enum):
     ERROR = 3      # Только ERROR
 
 
+# Числовые пороги фильтра - сравниваем int, а не Enum, на каждом вызове
+_DEBUG = LogLevelFilter.DEBUG.value
+_INFO = LogLevelFilter.INFO.value
+_WARNING = LogLevelFilter.WARNING.value
+
+
 class AgentLogger:
     """Logger for agent operations with rich formatting"""
 
     def __init__(self, log_level: str = "INFO"):
         self.log_level = self._parse_log_level(log_level)
+        self._min_level = self.log_level.value  # Кэш для быстрой проверки уровня
         self.indent_level = 0
-        self._print_lock = threading.Lock()  # Synchronize output from async code
+        self._prefix_cache = {}  # prefix -> готовая цветная метка "[PREFIX] "
+        # Producers only put() records; a single writer thread owns stdout
+        self._queue = queue.SimpleQueue()
+        threading.Thread(target=self._drain, name="AgentLoggerWriter", daemon=True).start()
+        if not _USE_COLOR:
+            self._format_message = self._format_message_plain
+        atexit.register(self.flush)
 
     @staticmethod
     def _parse_log_level(level_str: str) -> LogLevelFilter:
@@ -67,95 +110,192 @@ class AgentLogger:
     def set_log_level(self, level: str):
         """Установить уровень логирования"""
         self.log_level = self._parse_log_level(level)
+        self._min_level = self.log_level.value
 
     def _should_log_debug(self) -> bool:
         """Проверить, нужно ли логировать DEBUG сообщения"""
-        return self.log_level == LogLevelFilter.DEBUG
+        return self._min_level <= _DEBUG
 
     def _should_log_info(self) -> bool:
         """Проверить, нужно ли логировать INFO сообщения и выше"""
-        return self.log_level <= LogLevelFilter.INFO
+        return self._min_level <= _INFO
+
+    # Публичные имена для вызывающих: не форматировать debug() и не собирать данные для dom() впустую
+    debug_enabled = _should_log_debug
+    dom_enabled = _should_log_info
+
+    def _prefix_label(self, prefix: str) -> str:
+        """Цветная метка префикса (строится один раз на префикс)"""
+        label = self._prefix_cache.get(prefix)
+        if label is None:
+            label = f"{Style.BRIGHT}{Fore.CYAN}[{prefix}]{Style.RESET_ALL} "
+            self._prefix_cache[prefix] = label
+        return label
 
     def _format_message(self, level: LogLevel, message: str, prefix: str = None) -> str:
         """Format message with timestamp, emoji, and color"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
         emoji, color = level.value
-        indent = "  " * self.indent_level
+        level_idx = self.indent_level
+        indent = _INDENT_CACHE[level_idx] if level_idx < 16 else "  " * level_idx
         
         # Format: emoji [HH:MM:SS] [PREFIX] message
-        ts = f"{Style.DIM}[{timestamp}]{Style.RESET_ALL}"
-        
+        return "".join((
+            indent, emoji, " ",
+            _TS_OPEN, time.strftime("%H:%M:%S"), _TS_CLOSE,
+            self._prefix_label(prefix) if prefix else "",
+            color, message, _RESET
+        ))
+
+    def _format_message_plain(self, level: LogLevel, message: str, prefix: str = None) -> str:
+        """Format message without ANSI escapes (stdout is not a TTY)"""
+        level_idx = self.indent_level
+        indent = _INDENT_CACHE[level_idx] if level_idx < 16 else "  " * level_idx
         if prefix:
-            prefix_label = f"{Style.BRIGHT}{Fore.CYAN}[{prefix}]{Style.RESET_ALL}"
-            return f"{indent}{emoji} {ts} {prefix_label} {color}{message}{Style.RESET_ALL}"
-        return f"{indent}{emoji} {ts} {color}{message}{Style.RESET_ALL}"
-
-    def _print_with_flush(self, text: str):
-        """Print with immediate flush and lock to prevent buffer misalignment and race conditions"""
-        with self._print_lock:
-            print(text, flush=True)
+            return f"{indent}{level.value[0]} [{time.strftime('%H:%M:%S')}] [{prefix}] {message}"
+        return f"{indent}{level.value[0]} [{time.strftime('%H:%M:%S')}] {message}"
+
+    def _print_with_flush(self, text: str, force_flush: bool = False):
+        """Enqueue record for the writer thread; wait until it is written when forced"""
+        self._queue.put(text)
+        if force_flush:
+            self.flush()
+
+    def _drain(self):
+        """Writer thread: забрать всё, что накопилось, и записать одним write + flush"""
+        get_nowait = self._queue.get_nowait
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(get_nowait())
+                except queue.Empty:
+                    break
+            
+            lines = []
+            barriers = []
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    barriers.append(item)
+                else:
+                    lines.append(item)
+            
+            if lines:
+                lines.append("")  # Завершающий перевод строки
+                try:
+                    sys.stdout.write("\n".join(lines))
+                    sys.stdout.flush()
+                except Exception:
+                    pass  # Writer-поток не должен умирать из-за ошибки вывода
+            for barrier in barriers:
+                barrier.set()
+
+    def flush(self):
+        """Дождаться записи всех поставленных в очередь записей (перед input()/print() и при выходе)"""
+        barrier = threading.Event()
+        self._queue.put(barrier)
+        barrier.wait(_FLUSH_TIMEOUT)
 
     # ========== MAIN LOG METHODS ==========
+    # wait/success/info/warning принимают %-style args: строка форматируется, только если уровень включён
     
     def llm(self, message: str):
         """Log LLM action/response"""
+        if self._min_level > _INFO:
+            return
         self._print_with_flush(self._format_message(LogLevel.LLM, message, "LLM"))
 
     def analysis(self, message: str):
         """Log analysis step"""
+        if self._min_level > _INFO:
+            return
         self._print_with_flush(self._format_message(LogLevel.ANALYSIS, message, "INFO"))
 
     def think(self, message: str):
         """Log thinking/reasoning step"""
+        if self._min_level > _INFO:
+            return
         self._print_with_flush(self._format_message(LogLevel.THINK, message, "THINK"))
 
     def action(self, message: str):
         """Log action step"""
+        if self._min_level > _INFO:
+            return
         self._print_with_flush(self._format_message(LogLevel.ACTION, message, "ACTION"))
 
     def navigation(self, message: str):
         """Log navigation step"""
+        if self._min_level > _INFO:
+            return
         self._print_with_flush(self._format_message(LogLevel.NAVIGATION, message, "NAVIGATION"))
 
     def dom(self, message: str):
         """Log DOM analysis"""
+        if self._min_level > _INFO:
+            return
         self._print_with_flush(self._format_message(LogLevel.DOM, message, "DOM"))
 
-    def wait(self, message: str):
+    def wait(self, message: str, *args):
         """Log waiting step"""
+        if self._min_level > _INFO:
+            return
+        if args:
+            message = message % args
         self._print_with_flush(self._format_message(LogLevel.WAIT, message, "WAIT"))
 
-    def success(self, message: str):
+    def success(self, message: str, *args):
         """Log success"""
+        if self._min_level > _INFO:
+            return
+        if args:
+            message = message % args
         self._print_with_flush(self._format_message(LogLevel.SUCCESS, message, "SUCCESS"))
 
     def error(self, message: str):
         """Log error"""
-        self._print_with_flush(self._format_message(LogLevel.ERROR, message, "ERROR"))
+        self._print_with_flush(self._format_message(LogLevel.ERROR, message, "ERROR"), force_flush=True)
 
-    def info(self, message: str):
+    def info(self, message: str, *args):
         """Log info"""
+        if self._min_level > _INFO:
+            return
+        if args:
+            message = message % args
         self._print_with_flush(self._format_message(LogLevel.INFO, message, "INFO"))
 
     def debug(self, message: str):
         """Log debug information"""
-        if self._should_log_debug():
-            self._print_with_flush(self._format_message(LogLevel.DEBUG, message, "DEBUG"))
+        if self._min_level > _DEBUG:
+            return
+        self._print_with_flush(self._format_message(LogLevel.DEBUG, message, "DEBUG"))
+
+    def debug_lazy(self, producer):
+        """Log debug information built by producer() - called only if DEBUG is enabled"""
+        if self._min_level > _DEBUG:
+            return
+        self._print_with_flush(self._format_message(LogLevel.DEBUG, producer(), "DEBUG"))
 
-    def warning(self, message: str):
+    def warning(self, message: str, *args):
         """Log warning"""
+        if self._min_level > _WARNING:
+            return
+        if args:
+            message = message % args
         self._print_with_flush(self._format_message(LogLevel.WARNING, message, "WARNING"))
 
     def security_prompt(self, message: str):
         """Log security confirmation request"""
-        self._print_with_flush(self._format_message(LogLevel.SECURITY, message, "SECURITY"))
+        self._print_with_flush(self._format_message(LogLevel.SECURITY, message, "SECURITY"), force_flush=True)
 
     def decision(self, message: str):
         """Log decision making step"""
+        if self._min_level > _INFO:
+            return
         self._print_with_flush(self._format_message(LogLevel.DECISION, message, "THINK"))
 
     def result(self, message: str):
         """Log final result"""
+        if self._min_level > _INFO:
+            return
         self._print_with_flush(self._format_message(LogLevel.RESULT, message, "RESULT"))
 
     # ========== SECTION & FORMATTING METHODS ==========
@@ -190,6 +330,8 @@ class AgentLogger:
 
     def tool_call(self, tool_name: str, description: str = None):
         """Log tool call with brief description"""
+        if self._min_level > _INFO:
+            return
         if description:
             msg = f"Вызов: {tool_name} — {description}"
         else:
@@ -199,11 +341,12 @@ class AgentLogger:
 
     def start(self, note: str = None):
         """Log entering a function"""
-        stack = inspect.stack()
-        if len(stack) > 1:
-            caller = stack[1]
-            filename = caller.filename
-            func = caller.function
+        if self._min_level > _INFO:
+            return
+        caller = inspect.currentframe().f_back
+        if caller is not None:
+            filename = caller.f_code.co_filename
+            func = caller.f_code.co_name
         else:
             filename = '<unknown>'
             func = '<module>'
@@ -226,15 +369,15 @@ class AgentLogger:
     def ask_user(self, question: str) -> str:
         """Ask user for input"""
         self._print_with_flush("")
-        self._print_with_flush(f"{Fore.YELLOW}❓ {question}")
-        return input(f"{Fore.GREEN}> {Style.RESET_ALL}").strip()
+        self._print_with_flush(_ASK_MARK + question, force_flush=True)
+        return input(_ASK_PROMPT).strip()
 
     def confirm(self, message: str) -> bool:
         """Ask user for confirmation"""
         self._print_with_flush("")
-        self._print_with_flush(f"{Fore.MAGENTA}🔒 {message}")
-        response = input(f"{Fore.YELLOW}[Y/N] > {Style.RESET_ALL}").strip().lower()
-        return response in ['y', 'yes']
+        self._print_with_flush(_CONFIRM_MARK + message, force_flush=True)
+        response = input(_CONFIRM_PROMPT).strip().lower()
+        return response in _CONFIRM_YES
 
     # ========== LLM COMMUNICATION ==========
     
@@ -247,11 +390,12 @@ class AgentLogger:
         """
         self.section(f"🧠 ЗАПРОС К МОДЕЛИ [{function_name}]")
         
-        # Log brief question only
-        self._print_with_flush(f"{Fore.YELLOW}👤 ВОПРОС:{Style.RESET_ALL}")
-        indent_str = "  "
+        # Log brief question only - один блок вместо строки на каждую линию
+        parts = [f"{Fore.YELLOW}👤 ВОПРОС:{Style.RESET_ALL}"]
+        prefix = f"  {Fore.YELLOW}"
         for line in question.splitlines():
-            self._print_with_flush(f"{indent_str}{Fore.YELLOW}{line}{Style.RESET_ALL}")
+            parts.append(f"{prefix}{line}{Style.RESET_ALL}")
+        self._print_with_flush("\n".join(parts))
 
     def llm_response_received(self, response_text: str, function_name: str = ""):
         """Log full LLM response - shows what the model decided"""
@@ -262,16 +406,21 @@ class AgentLogger:
         indent_str = "  "
         response_lines = response_text.splitlines()
         
-        # Show all lines (no truncation for responses)
+        if not response_lines:
+            self._print_with_flush(f"{indent_str}{Fore.RED}[Empty response]{Style.RESET_ALL}")
+            return
+        
+        # Show all lines (no truncation for responses), собираем в один блок
+        json_prefix = f"{indent_str}{Fore.GREEN}"
+        text_prefix = f"{indent_str}{Fore.WHITE}"
+        parts = []
         for line in response_lines:
-            if line.startswith('{') or line.startswith('[') or line.strip().startswith('"'):
+            if line[:1] in _JSON_LEADS or line.lstrip()[:1] == '"':
                 # Highlight JSON
-                self._print_with_flush(f"{indent_str}{Fore.GREEN}{line}{Style.RESET_ALL}")
+                parts.append(f"{json_prefix}{line}{Style.RESET_ALL}")
             else:
-                self._print_with_flush(f"{indent_str}{Fore.WHITE}{line}{Style.RESET_ALL}")
-        
-        if not response_lines:
-            self._print_with_flush(f"{indent_str}{Fore.RED}[Empty response]{Style.RESET_ALL}")
+                parts.append(f"{text_prefix}{line}{Style.RESET_ALL}")
+        self._print_with_flush("\n".join(parts))
 
     # ========== SUMMARY/FINAL OUTPUT ==========
     
@@ -4,12 +4,38 @@ Handles command-line interface and agent lifecycle.
 """
 import asyncio
 import sys
+import threading
 from pathlib import Path
 from logger import logger
 from config_loader import config
 from browser_agent import BrowserAgent
 
 
+async def read_line(prompt: str = "") -> str:
+    """
+    input() без блокировки event loop.
+    Читаем в daemon-потоке (а не asyncio.to_thread): поток executor'а, зависший в input()
+    после Ctrl+C, не даст asyncio.run завершиться до нажатия Enter.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def _resolve(setter, value):
+        if not future.done():
+            setter(value)
+
+    def _reader():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(_resolve, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(_resolve, future.set_result, line)
+
+    threading.Thread(target=_reader, name="stdin-reader", daemon=True).start()
+    return await future
+
+
 async def main():
     """Main entry point"""
     
@@ -29,11 +55,13 @@ async def main():
         # Main loop
         while True:
             logger.info("📋 Ввод задачи")
+            logger.flush()
             print()
             
             # Get task from user
             logger.info("Введите вашу задачу (или 'выход' чтобы выйти):")
-            task_description = input("> ").strip()
+            logger.flush()
+            task_description = (await read_line("> ")).strip()
             
             if task_description.lower() in ['exit', 'quit', 'q', 'выход', 'вых']:
                 logger.info("Выход...")
@@ -64,9 +92,10 @@ async def main():
             except Exception as e:
                 logger.error(f"Ошибка выполнения задачи: {str(e)}")
             
+            logger.flush()
             print()
     
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logger.warning("Инициализация прервана пользователем (Ctrl+C)")
     except Exception as e:
         logger.error(f"Критическая ошибка: {str(e)}")
@@ -85,4 +114,8 @@ if __name__ == "__main__":
             # Fallback if policy not available in this Python build
             pass
     
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        # Ctrl+C во время await: main() уже остановил агент в finally
+        pass
@@ -2,13 +2,47 @@
 Uses API key and endpoint directly from `config.json` via `config_loader`.
 """
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
 import json
 import time
+import random
+import hashlib
+import uuid
+from email.utils import parsedate_to_datetime
 import asyncio
-import concurrent.futures
-from typing import List, Dict, Any, Optional, Generator, Union
+import contextlib
+import importlib.util
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Generator, AsyncGenerator, Union
 from logger import logger
 
+# orjson is optional: C-speed (de)serialization for payloads and SSE frames
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    # Fallback to stdlib json if orjson not installed
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    _loads = json.loads
+
+# Сжатые ответы: br объявляем только если есть brotli/brotlicffi - иначе ни requests, ни httpx его не распакуют.
+# Без него заголовок не переопределяем: клиенты и так шлют "gzip, deflate"
+_ACCEPT_ENCODING = (
+    "gzip, deflate, br"
+    if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi")
+    else None
+)
+
+# SSE framing, compared on raw bytes (строки не декодируются до yield)
+_SSE_PREFIX = b"data:"
+_SSE_DONE = b"[DONE]"
+
 
 class Message:
     """Message representation for API"""
@@ -20,6 +54,63 @@ class Message:
         return {"role": self.role, "content": self.content}
 
 
+class NvidiaAPIError(Exception):
+    """Base class for errors raised by NvidiaAPIClient"""
+
+
+class APIError(NvidiaAPIError):
+    """Non-200 response or malformed response body"""
+    def __init__(self, message: str, status: Optional[int] = None, body: str = ""):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class RateLimitError(APIError):
+    """429 persisted after max_rate_limit_retries"""
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message, status=429)
+        self.retry_after = retry_after
+
+
+class TransientNetworkError(NvidiaAPIError):
+    """Connection-level failure that survived all retries"""
+
+
+class TokenBucket:
+    """
+    Client-side rate limiter: `rate` requests per second with bursts up to `burst`.
+    Works for both sync (acquire) and async (acquire_async) callers; each caller
+    reserves a token up front, so waiters are served in arrival order.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token (may go negative) and return how long to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
 class NvidiaAPIClient:
     """Client for NVIDIA's API with streaming support"""
 
@@ -37,94 +128,303 @@ class NvidiaAPIClient:
         # New flags from config
         self.stream_default = config.get("stream", False)
         self.enable_reasoning = config.get("enable_reasoning", False)
+        # Prompt-cache friendly layout: [static system] + history + [dynamic context + user].
+        # Статический блок собирается один раз и не меняется - провайдер кэширует префикс
+        static_system_prompt = config.get("static_system_prompt")
+        static_prefix: List[Dict[str, Any]] = []
+        if static_system_prompt:
+            static_block: Dict[str, Any] = {"role": "system", "content": static_system_prompt}
+            if config.get("prompt_cache_control", False):
+                # Anthropic-style cache marker for passthrough endpoints
+                static_block["cache_control"] = {"type": "ephemeral"}
+            static_prefix.append(static_block)
+        self._static_frags: List[bytes] = [_dumps(block) for block in static_prefix]
+        self.dynamic_context = config.get("dynamic_context", "")
         # Retry configuration
         self.max_retries = 3
         self.retry_delay_base = 1  # seconds
+        self.max_rate_limit_retries = 5  # 429 не должен зацикливать запрос навсегда
+        self.max_retry_after = 60  # seconds, потолок ожидания по заголовкам сервера
+        # Proactive limiter: {"rps": 5, "burst": 10, "max_concurrency": 4} - не доводим сервер до 429
+        rate_limit = config.get("rate_limit") or {}
+        self._bucket = TokenBucket(rate_limit["rps"], rate_limit.get("burst", 1)) if rate_limit.get("rps") else None
+        max_concurrency = rate_limit.get("max_concurrency")
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
         }
+        if _ACCEPT_ENCODING:
+            self.headers["Accept-Encoding"] = _ACCEPT_ENCODING
+        # Optional response cache for one-shot analyze/decide (0 = off).
+        # Только для детерминированной генерации - креативные ответы не кэшируем
+        self.response_cache_size = int(config.get("response_cache_size", 0) or 0)
+        temperature = self.generation_params.get("temperature")
+        if temperature is None:  # не задана или null в конфиге - дефолт провайдера (1.0)
+            temperature = 1.0
+        if temperature >= 0.3:
+            self.response_cache_size = 0
+        self._response_cache: "OrderedDict[str, str]" = OrderedDict()
         self.conversation_history: List[Message] = []
+        # Rolling window: сколько сообщений истории хранить (системное не считается и не вытесняется), 0 = без лимита (по умолчанию)
+        self.max_history_messages = int(config.get("max_history_messages", 0) or 0)
+        # Сообщения истории, уже сериализованные в JSON: тело запроса склеивается без повторного кодирования истории
+        self._history_frags: List[bytes] = []
+        # Одна keep-alive сессия на клиента: TCP+TLS handshake не повторяется на каждый запрос
+        self._session = requests.Session()
+        self._session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0)  # Ретраи делаем сами
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        # httpx.AsyncClient создаётся лениво внутри event loop (см. _get_aclient)
+        self._aclient: Optional[httpx.AsyncClient] = None
+        # request key -> in-flight one-shot request (see call_async)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def close(self):
+        """Close pooled HTTP connections"""
+        session = getattr(self, "_session", None)
+        if session is not None:
+            session.close()
+
+    def _get_aclient(self) -> httpx.AsyncClient:
+        """Shared pooled async HTTP client (created on first async call)"""
+        if self._aclient is None or self._aclient.is_closed:
+            self._aclient = httpx.AsyncClient(
+                headers=self.headers,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                timeout=30,
+            )
+        return self._aclient
+
+    async def aclose(self):
+        """Close pooled connections of both sync and async clients"""
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
 
     def set_system_message(self, system_message: str):
         """Set initial system message for the conversation"""
         self.conversation_history = [Message("system", system_message)]
+        self._history_frags = [_dumps({"role": "system", "content": system_message})]
 
     def add_context_message(self, role: str, content: str):
         """Add a message to conversation history for context"""
         self.conversation_history.append(Message(role, content))
+        self._history_frags.append(_dumps({"role": role, "content": content}))
+        self._trim_history()
+
+    def _trim_history(self):
+        """Drop the oldest non-system messages beyond max_history_messages, in whole user/assistant pairs"""
+        if not self.max_history_messages:
+            return
+        messages = self.conversation_history
+        # Системное сообщение в начале остаётся - префикс для prompt-кэша не меняется
+        keep_from = 1 if messages and messages[0].role == "system" else 0
+        excess = len(messages) - keep_from - self.max_history_messages
+        if excess > 0:
+            cut = keep_from + excess
+            # Ответ ассистента без своего вопроса не оставляем - окно начинается с целой пары
+            if cut < len(messages) and messages[cut].role == "assistant" and messages[cut - 1].role == "user":
+                cut += 1
+            for history in (messages, self._history_frags):
+                del history[keep_from:cut]
+
+    def set_dynamic_context(self, context: str):
+        """Set per-turn context that is prepended to the user message (never to the cached prefix)"""
+        self.dynamic_context = context or ""
 
     def clear_history(self):
         """Clear conversation history"""
         self.conversation_history = []
+        self._history_frags = []
 
-    def _build_payload(self, message: str, use_history: bool, stream: bool = False) -> Dict[str, Any]:
-        messages = []
-        if use_history:
-            messages = [msg.to_dict() for msg in self.conversation_history]
-        messages.append({"role": "user", "content": message})
-
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            **self.generation_params
-        }
+    def _payload_options(self, stream: bool) -> Dict[str, Any]:
+        """Everything in the payload except messages"""
+        options = {"model": self.model, **self.generation_params}
         # If streaming is requested, add stream flag
         if stream:
-            payload["stream"] = True
+            options["stream"] = True
         # If reasoning is enabled, include a reasoning hint in the payload (best-effort)
         if self.enable_reasoning:
             # NVIDIA Integrate may support custom reasoning hints; include conservatively
-            payload["reasoning"] = {"enabled": True}
-        return payload
+            options["reasoning"] = {"enabled": True}
+        return options
+
+    def _build_payload_bytes(self, message: str, use_history: bool, stream: bool = False) -> bytes:
+        """
+        Request body spliced from pre-serialized message fragments:
+        [static system] + history + [dynamic context + user] - per turn only the new user message is encoded.
+        """
+        if self.dynamic_context:
+            message = f"{self.dynamic_context}\n\n{message}"
+        frags = [*self._static_frags, *self._history_frags] if use_history else [*self._static_frags]
+        frags.append(_dumps({"role": "user", "content": message}))
+        options = _dumps(self._payload_options(stream))
+        # options - непустой JSON-объект: убираем '}' и дописываем messages
+        return b"".join((options[:-1], b',"messages":[', b",".join(frags), b"]}"))
+
+    def _encode_request(self, message: str, use_history: bool, stream: bool) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Serialize the payload once per logical request and derive its Idempotency-Key.
+        Ключ одинаков для всех повторов этого запроса - сервер может отбросить дубликат;
+        два намеренно одинаковых запроса получают разные ключи.
+        """
+        body = self._build_payload_bytes(message, use_history, stream=stream)
+        idem = uuid.uuid4().hex
+        if stream:
+            idem += "-stream"
+        return body, {"Idempotency-Key": idem}
+
+    def _throttle(self):
+        """Sync gate before each HTTP attempt"""
+        if self._bucket is not None:
+            self._bucket.acquire()
+
+    @contextlib.asynccontextmanager
+    async def _agate(self):
+        """Async gate around each HTTP attempt: rate token, then a concurrency slot"""
+        if self._bucket is not None:
+            await self._bucket.acquire_async()
+        if self._semaphore is None:
+            yield
+        else:
+            async with self._semaphore:
+                yield
+
+    def _compute_retry_after(self, resp, rate_limited: int) -> float:
+        """
+        Seconds to wait after a 429: Retry-After (seconds or HTTP date), else
+        X-RateLimit-Reset (epoch or delta), else exponential backoff; plus jitter.
+        """
+        wait = None
+        retry_after = resp.headers.get("Retry-After")
+        if retry_after:
+            try:
+                wait = float(retry_after)
+            except ValueError:
+                try:
+                    wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    wait = None
+        if wait is None:
+            reset = resp.headers.get("X-RateLimit-Reset")
+            if reset:
+                try:
+                    reset_value = float(reset)
+                    # Большие значения - unix timestamp, маленькие - секунды до сброса
+                    wait = reset_value - time.time() if reset_value > 1e9 else reset_value
+                except ValueError:
+                    wait = None
+        if wait is None:
+            wait = self.retry_delay_base * (2 ** rate_limited)
+        wait = min(max(wait, 0.0), self.max_retry_after)
+        return wait + random.uniform(0, 0.5 * wait)
+
+    @staticmethod
+    def _parse_body(content: bytes) -> Dict[str, Any]:
+        """Decode a 200 response body; malformed JSON becomes APIError (orjson/json decode errors are ValueError)"""
+        try:
+            return _loads(content)
+        except ValueError as e:
+            logger.error("Неверный формат ответа API")
+            raise APIError("Неверный формат ответа API", status=200, body=content[:200].decode("utf-8", errors="replace")) from e
+
+    def _handle_result(self, result: Dict[str, Any], use_history: bool) -> str:
+        """Extract text from a non-streaming completion and record it in history"""
+        if "choices" in result and len(result["choices"]) > 0:
+            choice = result["choices"][0]
+            response_text = None
+            if isinstance(choice, dict):
+                if "message" in choice and isinstance(choice["message"], dict):
+                    response_text = choice["message"].get("content")
+                else:
+                    response_text = choice.get("text") or choice.get("content")
+            response_text = response_text or ""
+            if use_history and response_text:
+                self.add_context_message("assistant", response_text)
+            logger.success("Ответ от API получен")
+            return response_text
+        logger.error("Неверный формат ответа API")
+        raise APIError("Неверный формат ответа API")
+
+    @staticmethod
+    def _parse_stream_line(line: bytes) -> List[str]:
+        """Parse one SSE / JSON-lines frame (raw bytes) into text pieces (reasoning first, then content)"""
+        # Some servers prefix SSE with 'data: '
+        if line[:5] == _SSE_PREFIX:
+            line = line[5:]
+        line = line.strip()
+        if not line or line == _SSE_DONE:
+            return []
+        # Кадры без текстовых полей (role/usage/finish_reason) не разбираем вовсе
+        if line[:1] == b"{" and b'"content"' not in line and b'"reasoning' not in line and b'"text"' not in line:
+            return []
+        try:
+            obj = _loads(line)
+        except Exception:
+            # Not JSON: yield raw chunk
+            return [line.decode("utf-8", errors="replace")]
+
+        # Parse common streaming chunk structure
+        choices = obj.get("choices") or []
+        if not choices:
+            return []
+        delta = choices[0].get("delta") or {}
+        # 'reasoning_content' may be present
+        reasoning = delta.get("reasoning_content") or delta.get("reasoning")
+        content = delta.get("content") or delta.get("text")
+        return [piece for piece in (reasoning, content) if piece]
 
     def _call_with_retry(self, message: str, use_history: bool) -> Optional[str]:
         """Make API call with retry logic on connection errors"""
+        body, idem_headers = self._encode_request(message, use_history, stream=False)
         attempt = 0
+        rate_limited = 0
         while attempt < self.max_retries:
             try:
-                payload = self._build_payload(message, use_history, stream=False)
-                logger.wait(f"Отправляю запрос на {self.endpoint}...")
-                response = requests.post(self.endpoint, headers=self.headers, json=payload, timeout=30)
+                logger.wait("Отправляю запрос на %s...", self.endpoint)
+                self._throttle()
+                response = self._session.post(self.endpoint, data=body, headers=idem_headers, timeout=30)
                 
                 # 🚨 SPECIAL HANDLING FOR 429 (Too Many Requests)
                 if response.status_code == 429:
-                    logger.warning(f"⏳ API: 429 Too Many Requests - жду 10 секунд...")
-                    time.sleep(10)
-                    logger.info(f"⏳ Повторяю запрос после паузы...")
-                    # Retry immediately without incrementing attempt counter
+                    if rate_limited >= self.max_rate_limit_retries:
+                        logger.error(f"API: 429 Too Many Requests - лимит повторов ({self.max_rate_limit_retries}) исчерпан")
+                        raise RateLimitError("API Ошибка 429", retry_after=self._compute_retry_after(response, rate_limited))
+                    wait_time = self._compute_retry_after(response, rate_limited)
+                    rate_limited += 1
+                    logger.warning("⏳ API: 429 Too Many Requests - жду %.1f с...", wait_time)
+                    time.sleep(wait_time)
+                    logger.info("⏳ Повторяю запрос после паузы...")
+                    # Retry without spending a connection-error attempt
                     continue
                 
                 if response.status_code != 200:
                     logger.error(f"Ошибка API: {response.status_code} - {response.text[:200]}")
-                    raise Exception(f"API Ошибка {response.status_code}")
-
-                result = response.json()
-                if "choices" in result and len(result["choices"]) > 0:
-                    choice = result["choices"][0]
-                    response_text = None
-                    if isinstance(choice, dict):
-                        if "message" in choice and isinstance(choice["message"], dict):
-                            response_text = choice["message"].get("content")
-                        else:
-                            response_text = choice.get("text") or choice.get("content")
-                    response_text = response_text or ""
-                    if use_history and response_text:
-                        self.add_context_message("assistant", response_text)
-                    logger.success(f"Ответ от API получен")
-                    return response_text
-                raise Exception("Неверный формат ответа API")
+                    raise APIError(f"API Ошибка {response.status_code}", status=response.status_code, body=response.text[:200])
+
+                return self._handle_result(self._parse_body(response.content), use_history)
 
             except (requests.exceptions.RequestException, ConnectionError) as e:
-                logger.warning(f"Ошибка соединения (попытка {attempt + 1}/{self.max_retries}): {type(e).__name__}")
+                logger.warning("Ошибка соединения (попытка %d/%d): %s", attempt + 1, self.max_retries, type(e).__name__)
                 attempt += 1
                 if attempt < self.max_retries:
                     wait_time = self.retry_delay_base * (2 ** (attempt - 1))
-                    logger.info(f"Жду {wait_time}с перед повторной попыткой...")
+                    logger.info("Жду %sс перед повторной попыткой...", wait_time)
                     time.sleep(wait_time)
                 else:
                     logger.error(f"Все попытки исчерпаны после {self.max_retries} попыток")
-                    raise
+                    raise TransientNetworkError(f"Все попытки исчерпаны после {self.max_retries} попыток") from e
+            except NvidiaAPIError:
+                raise  # Уже залогировано выше
             except Exception as e:
                 logger.error(f"Необратимая ошибка: {str(e)}")
                 raise
@@ -143,8 +443,6 @@ class NvidiaAPIClient:
             "отправить запрос в LLM и получить ответ"
         )
 
-        payload = self._build_payload(message, use_history)
-
         # Determine streaming behavior: explicit arg overrides config default
         if stream is None:
             stream = bool(self.stream_default)
@@ -154,21 +452,151 @@ class NvidiaAPIClient:
 
         return self._call_with_retry(message, use_history)
 
-    async def call_async(self, message: str, use_history: bool = True, stream: Optional[bool] = None) -> Union[Optional[str], Generator[str, None, None]]:
+    async def call_async(self, message: str, use_history: bool = True, stream: Optional[bool] = None) -> Union[Optional[str], AsyncGenerator[str, None]]:
         """
-        Async wrapper around call() to be used with await in async context.
-        Runs the blocking call in a thread pool to avoid blocking event loop.
+        Native async version of call() on a pooled httpx.AsyncClient (no thread hop).
+        If `stream` is True, returns an async generator (iterate with `async for`).
         """
-        loop = asyncio.get_event_loop()
-        
-        # Run sync call in executor to not block event loop
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            result = await loop.run_in_executor(
-                executor,
-                lambda: self.call(message, use_history, stream)
-            )
-        
-        return result
+        logger.tool_call(
+            "nvidia_api.call_async",
+            "отправить запрос в LLM и получить ответ"
+        )
+
+        if stream is None:
+            stream = bool(self.stream_default)
+
+        if stream:
+            return self.stream_call_async(message, use_history)
+
+        if use_history:
+            # История меняется после каждого ответа - такие запросы не склеиваем
+            return await self._acall_with_retry(message, use_history)
+
+        # Single-flight: одинаковые one-shot запросы в полёте делят один запрос.
+        # Тело кодируем сразу: ключ и отправленный запрос совпадают, даже если контекст сменится
+        encoded = self._encode_request(message, use_history, stream=False)
+        key = self._request_key(encoded[0])
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._acall_with_retry(message, use_history, encoded))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _task: self._inflight.pop(key, None))
+        else:
+            logger.debug("Такой же запрос уже выполняется - жду его ответ")
+        # shield: отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(task)
+
+    async def _acall_with_retry(self, message: str, use_history: bool,
+                                encoded: Optional[Tuple[bytes, Dict[str, str]]] = None) -> Optional[str]:
+        """Async twin of _call_with_retry (`encoded` - body and headers already built by the caller)"""
+        client = self._get_aclient()
+        body, idem_headers = encoded or self._encode_request(message, use_history, stream=False)
+        attempt = 0
+        rate_limited = 0
+        while attempt < self.max_retries:
+            try:
+                logger.wait("Отправляю запрос на %s...", self.endpoint)
+                async with self._agate():
+                    response = await client.post(self.endpoint, content=body, headers=idem_headers)
+                
+                # 🚨 SPECIAL HANDLING FOR 429 (Too Many Requests)
+                if response.status_code == 429:
+                    if rate_limited >= self.max_rate_limit_retries:
+                        logger.error(f"API: 429 Too Many Requests - лимит повторов ({self.max_rate_limit_retries}) исчерпан")
+                        raise RateLimitError("API Ошибка 429", retry_after=self._compute_retry_after(response, rate_limited))
+                    wait_time = self._compute_retry_after(response, rate_limited)
+                    rate_limited += 1
+                    logger.warning("⏳ API: 429 Too Many Requests - жду %.1f с...", wait_time)
+                    await asyncio.sleep(wait_time)
+                    logger.info("⏳ Повторяю запрос после паузы...")
+                    # Retry without spending a connection-error attempt
+                    continue
+                
+                if response.status_code != 200:
+                    logger.error(f"Ошибка API: {response.status_code} - {response.text[:200]}")
+                    raise APIError(f"API Ошибка {response.status_code}", status=response.status_code, body=response.text[:200])
+
+                return self._handle_result(self._parse_body(response.content), use_history)
+
+            except httpx.TransportError as e:
+                logger.warning("Ошибка соединения (попытка %d/%d): %s", attempt + 1, self.max_retries, type(e).__name__)
+                attempt += 1
+                if attempt < self.max_retries:
+                    wait_time = self.retry_delay_base * (2 ** (attempt - 1))
+                    logger.info("Жду %sс перед повторной попыткой...", wait_time)
+                    await asyncio.sleep(wait_time)
+                else:
+                    logger.error(f"Все попытки исчерпаны после {self.max_retries} попыток")
+                    raise TransientNetworkError(f"Все попытки исчерпаны после {self.max_retries} попыток") from e
+            except NvidiaAPIError:
+                raise  # Уже залогировано выше
+            except Exception as e:
+                logger.error(f"Необратимая ошибка: {str(e)}")
+                raise
+
+    async def stream_call_async(self, message: str, use_history: bool = True) -> AsyncGenerator[str, None]:
+        """Async twin of stream_call: yields partial strings as they arrive"""
+        client = self._get_aclient()
+        body, idem_headers = self._encode_request(message, use_history, stream=True)
+        attempt = 0
+        rate_limited = 0
+        while attempt < self.max_retries:
+            try:
+                logger.wait("Отправляю streaming-запрос на %s... (попытка %d/%d, stream=True)", self.endpoint, attempt + 1, self.max_retries)
+                async with self._agate(), client.stream("POST", self.endpoint, content=body, headers=idem_headers) as resp:
+                    
+                    # 🚨 SPECIAL HANDLING FOR 429 (Too Many Requests)
+                    if resp.status_code == 429:
+                        if rate_limited >= self.max_rate_limit_retries:
+                            logger.error(f"API: 429 Too Many Requests - лимит повторов ({self.max_rate_limit_retries}) исчерпан")
+                            raise RateLimitError("API Ошибка 429", retry_after=self._compute_retry_after(resp, rate_limited))
+                        wait_time = self._compute_retry_after(resp, rate_limited)
+                        rate_limited += 1
+                    
+                    elif resp.status_code != 200:
+                        logger.error(f"Streaming API ошибка: {resp.status_code}")
+                        raise APIError(f"API Ошибка {resp.status_code}", status=resp.status_code)
+
+                    else:
+                        # aiter_lines() декодирует в str - режем байты на строки сами
+                        pending = b""
+                        async for chunk in resp.aiter_bytes():
+                            *lines, pending = (pending + chunk).split(b"\n")
+                            for line in lines:
+                                if not line:
+                                    continue
+                                for piece in self._parse_stream_line(line):
+                                    yield piece
+                        if pending:
+                            for piece in self._parse_stream_line(pending):
+                                yield piece
+                
+                if resp.status_code == 429:
+                    # Ждём вне _agate/stream: слот семафора и соединение уже отданы другим запросам
+                    logger.warning("⏳ API: 429 Too Many Requests - жду %.1f с...", wait_time)
+                    await asyncio.sleep(wait_time)
+                    logger.info("⏳ Повторяю streaming-запрос после паузы...")
+                    # Retry without spending a connection-error attempt
+                    continue
+                
+                logger.success("Streaming завершён")
+                return  # Success
+
+            except httpx.TransportError as e:
+                logger.warning("Ошибка streaming соединения (попытка %d/%d): %s", attempt + 1, self.max_retries, type(e).__name__)
+                attempt += 1
+                if attempt < self.max_retries:
+                    wait_time = self.retry_delay_base * (2 ** (attempt - 1))
+                    logger.info("Жду %sс перед повторной streaming-попыткой...", wait_time)
+                    await asyncio.sleep(wait_time)
+                else:
+                    logger.error(f"Streaming прерван: все {self.max_retries} попыток исчерпаны")
+                    raise TransientNetworkError(f"Streaming прерван: все {self.max_retries} попыток исчерпаны") from e
+            except NvidiaAPIError:
+                raise  # Уже залогировано выше
+            except Exception as e:
+                logger.error(f"Необратимая ошибка streaming: {str(e)}")
+                raise
 
     def stream_call(self, message: str, use_history: bool = True) -> Generator[str, None, None]:
         """
@@ -176,88 +604,112 @@ class NvidiaAPIClient:
 
         Yields partial strings as they arrive (reasoning and content chunks).
         """
+        body, idem_headers = self._encode_request(message, use_history, stream=True)
         attempt = 0
+        rate_limited = 0
         while attempt < self.max_retries:
             try:
-                payload = self._build_payload(message, use_history, stream=True)
-                logger.wait(f"Отправляю streaming-запрос на {self.endpoint}... (попытка {attempt + 1}/{self.max_retries}, stream=True)")
-                resp = requests.post(self.endpoint, headers=self.headers, json=payload, stream=True, timeout=30)
+                logger.wait("Отправляю streaming-запрос на %s... (попытка %d/%d, stream=True)", self.endpoint, attempt + 1, self.max_retries)
+                self._throttle()
+                resp = self._session.post(self.endpoint, data=body, headers=idem_headers, stream=True, timeout=30)
                 
                 # 🚨 SPECIAL HANDLING FOR 429 (Too Many Requests)
                 if resp.status_code == 429:
-                    logger.warning(f"⏳ API: 429 Too Many Requests - жду 5 секунд...")
-                    time.sleep(5)
-                    logger.info(f"⏳ Повторяю streaming-запрос после паузы...")
-                    # Retry immediately without incrementing attempt counter
+                    if rate_limited >= self.max_rate_limit_retries:
+                        logger.error(f"API: 429 Too Many Requests - лимит повторов ({self.max_rate_limit_retries}) исчерпан")
+                        raise RateLimitError("API Ошибка 429", retry_after=self._compute_retry_after(resp, rate_limited))
+                    wait_time = self._compute_retry_after(resp, rate_limited)
+                    rate_limited += 1
+                    resp.close()  # Вернуть соединение в пул
+                    logger.warning("⏳ API: 429 Too Many Requests - жду %.1f с...", wait_time)
+                    time.sleep(wait_time)
+                    logger.info("⏳ Повторяю streaming-запрос после паузы...")
+                    # Retry without spending a connection-error attempt
                     continue
                 
                 if resp.status_code != 200:
                     logger.error(f"Streaming API ошибка: {resp.status_code}")
-                    raise Exception(f"API Ошибка {resp.status_code}")
+                    raise APIError(f"API Ошибка {resp.status_code}", status=resp.status_code)
 
-                for line in resp.iter_lines(decode_unicode=True):
+                for line in resp.iter_lines(decode_unicode=False):
                     if not line:
                         continue
-                    text = line.strip()
-                    # Some servers prefix SSE with 'data: '
-                    if text.startswith("data:"):
-                        text = text[len("data:"):].strip()
-                    if not text or text == "[DONE]":
-                        continue
-                    try:
-                        obj = json.loads(text)
-                    except Exception:
-                        # Not JSON: yield raw chunk
-                        yield text
-                        continue
-
-                    # Parse common streaming chunk structure
-                    choices = obj.get("choices") or []
-                    if not choices:
-                        continue
-                    delta = choices[0].get("delta") or {}
-                    # 'reasoning_content' may be present
-                    reasoning = delta.get("reasoning_content") or delta.get("reasoning")
-                    content = delta.get("content") or delta.get("text")
-                    if reasoning:
-                        yield reasoning
-                    if content:
-                        yield content
+                    yield from self._parse_stream_line(line)
                 
                 logger.success("Streaming завершён")
                 return  # Success
 
             except (requests.exceptions.RequestException, ConnectionError) as e:
-                logger.warning(f"Ошибка streaming соединения (попытка {attempt + 1}/{self.max_retries}): {type(e).__name__}")
+                logger.warning("Ошибка streaming соединения (попытка %d/%d): %s", attempt + 1, self.max_retries, type(e).__name__)
                 attempt += 1
                 if attempt < self.max_retries:
                     wait_time = self.retry_delay_base * (2 ** (attempt - 1))
-                    logger.info(f"Жду {wait_time}с перед повторной streaming-попыткой...")
+                    logger.info("Жду %sс перед повторной streaming-попыткой...", wait_time)
                     time.sleep(wait_time)
                 else:
                     logger.error(f"Streaming прерван: все {self.max_retries} попыток исчерпаны")
-                    raise
+                    raise TransientNetworkError(f"Streaming прерван: все {self.max_retries} попыток исчерпаны") from e
+            except NvidiaAPIError:
+                raise  # Уже залогировано выше
             except Exception as e:
                 logger.error(f"Необратимая ошибка streaming: {str(e)}")
                 raise
 
-    def analyze(self, prompt: str, context: str = "") -> str:
-        message = prompt if not context else f"{context}\n\n{prompt}"
-        return self.call(message, use_history=False, stream=False)
+    @staticmethod
+    def _request_key(body: bytes) -> str:
+        """Key of the final encoded request: static prefix, dynamic context, model, params and prompt"""
+        return hashlib.blake2b(body, digest_size=16).hexdigest()
 
-    async def analyze_async(self, prompt: str, context: str = "") -> str:
-        """Async version of analyze()"""
-        message = prompt if not context else f"{context}\n\n{prompt}"
-        return await self.call_async(message, use_history=False, stream=False)
+    def _cache_get(self, key: str) -> Optional[str]:
+        """Cached one-shot response for this exact request (LRU)"""
+        if not self.response_cache_size:
+            return None
+        hit = self._response_cache.get(key)
+        if hit is not None:
+            self._response_cache.move_to_end(key)
+            logger.debug("Ответ взят из кэша (тот же запрос)")
+        return hit
 
-    def decide(self, prompt: str, context: str = "") -> str:
+    def _cache_put(self, key: str, response: Optional[str]):
+        """Remember one-shot response, evicting the least recently used entry"""
+        if not self.response_cache_size or not response:
+            return
+        self._response_cache[key] = response
+        self._response_cache.move_to_end(key)
+        if len(self._response_cache) > self.response_cache_size:
+            self._response_cache.popitem(last=False)
+
+    def _oneshot_key(self, message: str) -> Optional[str]:
+        """Response-cache key for a one-shot message (None when the cache is off)"""
+        if not self.response_cache_size:
+            return None
+        return self._request_key(self._build_payload_bytes(message, use_history=False))
+
+    def _oneshot(self, prompt: str, context: str = "") -> str:
+        """One-shot request without history (analyze/decide share this implementation)"""
         message = prompt if not context else f"{context}\n\n{prompt}"
-        return self.call(message, use_history=False, stream=False)
+        # Ключ снимаем до запроса: dynamic_context может смениться, пока ждём ответ
+        key = self._oneshot_key(message)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        response = self.call(message, use_history=False, stream=False)
+        self._cache_put(key, response)
+        return response
 
-    async def decide_async(self, prompt: str, context: str = "") -> str:
-        """Async version of decide()"""
+    async def _oneshot_async(self, prompt: str, context: str = "") -> str:
+        """Async version of _oneshot()"""
         message = prompt if not context else f"{context}\n\n{prompt}"
-        return await self.call_async(message, use_history=False, stream=False)
+        key = self._oneshot_key(message)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        response = await self.call_async(message, use_history=False, stream=False)
+        self._cache_put(key, response)
+        return response
+
+    analyze = decide = _oneshot
+    analyze_async = decide_async = _oneshot_async
 
     def stream_decide(self, prompt: str, context: str = "") -> Generator[str, None, None]:
         message = prompt if not context else f"{context}\n\n{prompt}"
@@ -3,11 +3,501 @@ Page analyzer module.
 Analyzes web page structure and finds interactive elements.
 Provides structured page representation without raw HTML.
 """
-from typing import List, Dict, Any, Optional
-from playwright.async_api import Page, ElementHandle, Locator
+from typing import List, Dict, Any, Optional, Set, Tuple
+from playwright.async_api import Page, Locator, Error as PWError
 from logger import logger
 import json
 import asyncio
+import copy
+import sys
+
+# orjson опционален: быстрая сериализация PageAnalysis.to_json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Видимость как у Playwright is_visible(): непустой bounding box и не visibility:hidden
+_JS_IS_VISIBLE = """
+    const isVisible = (e) => {
+        const r = e.getBoundingClientRect();
+        return r.width > 0 && r.height > 0 && getComputedStyle(e).visibility !== 'hidden';
+    };
+"""
+
+# "Не скрыт" как у движка ролей (get_by_role): не aria-hidden и не скрыт CSS (display/visibility)
+_JS_IS_SHOWN = """
+    const isShown = (el) => !el.closest('[aria-hidden="true"]')
+        && (!el.checkVisibility || el.checkVisibility({checkVisibilityCSS: true, visibilityProperty: true}));
+"""
+
+# Селекторы, общие для snapshot и evaluate_all
+_INPUT_SELECTOR = 'input:not([type="hidden"]), textarea, [contenteditable="true"]'
+# CSS-приближение get_by_role("button"): явная роль + нативные кнопки
+_BUTTON_SELECTOR = 'button, [role="button"], input[type="button"], input[type="submit"], input[type="reset"], input[type="image"]'
+_DIALOG_SELECTOR = 'dialog, [role="dialog"]'
+# Строгая модаль для _detect_modals: только явные ARIA-роли
+_ARIA_DIALOG_SELECTOR = '[role="dialog"], [role="alertdialog"]'
+# CSS-приближение get_by_role("searchbox")
+_SEARCHBOX_SELECTOR = 'input[type="search"]:not([list]), [role="searchbox"]'
+# Модалка: dialog по роли и частые классы старых сайтов - одним объединённым селектором
+_MODAL_PARTS = ('dialog', '[role="dialog"]', 'div[class*="modal"]', 'div[class*="popup"]', '.fade.show')
+_MODAL_SELECTOR = ", ".join(_MODAL_PARTS)
+# Метод 2 _detect_modals: [role="dialog"] уже проверен методом 1 (_ARIA_DIALOG_SELECTOR) - без него
+_MODAL_CLASS_SELECTOR = ", ".join(part for part in _MODAL_PARTS if part != '[role="dialog"]')
+# То же с движком :visible Playwright - видимость проверяется в той же выборке, без is_visible()
+_MODAL_VISIBLE_SELECTOR = ", ".join(part + ":visible" for part in _MODAL_PARTS)
+# CSS-приближения ролей для перечислений: без полного обхода дерева и вычисления accessible name,
+# которые делает движок get_by_role (скрытые элементы отсекаются в JS через isShown)
+_LINK_SELECTOR = 'a[href], area[href], [role="link"]'
+_OPTION_SELECTOR = '[role="option"], option'
+_TEXTBOX_SELECTOR = (
+    'input:not([type]), input[type="text"], input[type="email"], input[type="tel"], input[type="url"], '
+    'textarea, [role="textbox"]'
+)
+# Счётчики снимка (явная роль + нативные элементы)
+_ROLE_COUNT_SELECTORS = {
+    "links": _LINK_SELECTOR,
+    "checkboxes": 'input[type="checkbox"], [role="checkbox"]',
+    "radios": 'input[type="radio"], [role="radio"]',
+    "selects": 'select:not([multiple]):not([size]), input[list], [role="combobox"]',
+    "listboxes": 'select[multiple], select[size], [role="listbox"]',
+    "dialogs": _DIALOG_SELECTOR,
+}
+
+# Запись об input-поле: видимость проверяется снаружи, здесь editable, стратегия поиска, контекст, варианты
+_JS_INPUT_RECORD = """
+    const inputRecord = (el) => {
+        // Ищем текст рядом с инпутом: связанный лейбл, иначе близкий родитель
+        let context = "";
+        if (el.labels && el.labels[0]) {
+            context = el.labels[0].innerText;
+        }
+        if (!context && el.parentElement) {
+            context = el.parentElement.innerText?.split(el.value)[0] || "";
+        }
+        // Варианты выбора: select или input с datalist
+        let options = [];
+        if (el.tagName === 'SELECT') {
+            options = Array.from(el.options).slice(0, 5).map(o => o.text);
+        }
+        if (el.getAttribute('list')) {
+            const datalist = document.getElementById(el.getAttribute('list'));
+            if (datalist) {
+                options = Array.from(datalist.options || datalist.children)
+                    .slice(0, 5)
+                    .map(o => o.text || o.value);
+            }
+        }
+        // Стратегия поиска поля по приоритету: placeholder > aria-label > label > id > (textarea → role)
+        const pick = () => {
+            const p = el.getAttribute('placeholder'), a = el.getAttribute('aria-label'),
+                  l = el.labels?.[0]?.innerText, i = el.getAttribute('id');
+            if (p) return ['placeholder', p];
+            if (a) return ['aria-label', a];
+            if (l) return ['label', l];
+            if (i) return ['id', i];
+            if (el.tagName === 'TEXTAREA') return ['role', 'textbox'];
+            return [null, null];
+        };
+        const [strategy, value] = pick();
+        // Строки режем здесь, а не в Python - по CDP идёт только нужное
+        return {
+            // Как is_editable() у Playwright: не :disabled (включая disabled fieldset), не readonly, не aria-*
+            editable: !el.matches(':disabled') && el.getAttribute('aria-disabled') !== 'true'
+                && !el.readOnly && el.getAttribute('aria-readonly') !== 'true'
+                && (el.isContentEditable || 'value' in el),
+            strategy: strategy,
+            value: value ? value.slice(0, 60) : value,
+            context: context.trim().substring(0, 100),
+            options: options.filter(o => o).slice(0, 3).map(o => o.slice(0, 60))
+        };
+    };
+"""
+
+# Готовая строка кнопки для подсказки: [SUBMIT] + текст (текст → aria-label → title → id) + (data-*).
+# '' - если показать нечего. searchRects - прямоугольники полей поиска:
+# кнопка справа от поля (до 200px, по высоте ±20px) = отправка поиска
+_JS_BUTTON_LABEL = """
+    const buttonLabel = (elem, searchRects) => {
+        const data_attrs = {};
+        for (const attr of elem.attributes) {
+            if (attr.name.startsWith('data-')) {
+                data_attrs[attr.name] = attr.value.slice(0, 60);
+            }
+        }
+        // Take first line only
+        const text = (elem.innerText || elem.textContent || '').split('\\n')[0].trim();
+        const aria = (elem.getAttribute('aria-label') || '').trim();
+        const title = (elem.getAttribute('title') || '').trim();
+        const id = (elem.getAttribute('id') || '').trim();
+        const display_text = text
+            || (aria && '[aria-label] ' + aria)
+            || (title && '[title] ' + title)
+            || (id && '[id] ' + id)
+            || '';
+        if (!display_text) return '';
+        const r = elem.getBoundingClientRect();
+        const is_search_button = searchRects.some(s =>
+            Math.abs(r.x - (s.x + s.width)) < 200 && r.y >= s.y - 20 && r.y <= s.y + s.height + 20
+        );
+        let label = (is_search_button ? '[SUBMIT] ' : '') + display_text.slice(0, 80);
+        const attr_str = Object.entries(data_attrs).map(([k, v]) => `${k}="${v}"`).join(' ');
+        if (attr_str) label += ` (${attr_str.slice(0, 60)})`;
+        return label;
+    };
+"""
+
+# data-* плюс перечисленные атрибуты элемента
+_JS_COLLECT_ATTRS = """
+    const collectAttrs = (elem, names) => {
+        const attrs = {};
+        for (const attr of elem.attributes) {
+            if (attr.name.startsWith('data-') || names.includes(attr.name)) {
+                attrs[attr.name] = attr.value.slice(0, 60);
+            }
+        }
+        return attrs;
+    };
+"""
+
+# Ссылки одним evaluate_all: первая строка - текст, вторая и третья - контекст (YouTube ·, дата и т.д.).
+# Короткие (<= 2 символов) и повторы "текст (контекст)" отсеиваются здесь - по CDP идут только готовые строки
+_LINKS_JS = "(els) => {" + _JS_IS_SHOWN + """
+        const seen = new Set();
+        for (const elem of els) {
+            if (!isShown(elem)) continue;
+            const lines = (elem.innerText || elem.textContent || '').split('\\n');
+            const text = lines[0].trim().slice(0, 60);
+            if (text.length <= 2) continue;
+            const context = lines.length > 1 ? lines.slice(1, 3).join(' · ').trim().slice(0, 40) : '';
+            seen.add(context.length > 2 ? `${text} (${context})` : text);
+        }
+        return Array.from(seen);
+    }"""
+
+# Первые 15 опций листбокса с текстом: текст + data-*/value/id
+_OPTIONS_JS = "(els) => {" + _JS_IS_SHOWN + _JS_COLLECT_ATTRS + """
+        return els.filter(isShown).map(elem => ({
+            text: (elem.textContent || '').trim().slice(0, 40),
+            elem: elem
+        })).filter(o => o.text).slice(0, 15).map(o => ({
+            text: o.text,
+            attrs: collectAttrs(o.elem, ['value', 'id'])
+        }));
+    }"""
+
+# Видимые диалоги: по 15 первых кнопок/опций внутри каждого (сначала кнопки, потом опции)
+_DIALOG_ITEMS_JS = "(els) => {" + _JS_IS_VISIBLE + _JS_COLLECT_ATTRS + """
+        return els.filter(isVisible).map(dialog => {
+            const items = [
+                ...dialog.querySelectorAll(%(button)s),
+                ...dialog.querySelectorAll(%(option)s)
+            ];
+            return {
+                total: items.length,
+                items: items.slice(0, 15).map(elem => ({
+                    text: (elem.textContent || '').trim().slice(0, 50),
+                    attrs: collectAttrs(elem, ['value', 'id'])
+                })).filter(row => row.text || Object.keys(row.attrs).length)
+            };
+        });
+    }""" % {"button": json.dumps(_BUTTON_SELECTOR), "option": json.dumps(_OPTION_SELECTOR)}
+
+# Popup/modal по CSS-классам (как Dodo Pizza): видимые кнопки/опции/пункты меню ВНУТРИ видимых popup-контейнеров.
+# Запрос ограничен самими контейнерами - без обхода предков у каждой кнопки страницы.
+# null - если видимых popup-контейнеров нет вовсе; items - первые 20 (total - сколько всего)
+_POPUP_ITEMS_JS = "() => {" + _JS_IS_VISIBLE + _JS_COLLECT_ATTRS + """
+        const popups = Array.from(document.querySelectorAll('[class*="popup"], [class*="modal"]')).filter(elem => {
+            const rect = elem.getBoundingClientRect();
+            return rect.width > 0 && rect.height > 0 && getComputedStyle(elem).display !== 'none';
+        });
+        if (!popups.length) return null;
+        // Вложенные popup-контейнеры дают одни и те же элементы - считаем каждый один раз
+        const seen = new Set();
+        const items = [];
+        for (const popup of popups) {
+            for (const elem of popup.querySelectorAll(%(items)s)) {
+                if (seen.has(elem) || !isVisible(elem)) continue;
+                seen.add(elem);
+                items.push(elem);
+            }
+        }
+        return {
+            total: items.length,
+            items: items.slice(0, 20).map(elem => ({
+                text: (elem.textContent || '').trim().slice(0, 50),
+                attrs: collectAttrs(elem, ['id', 'class', 'onclick'])
+            })).filter(row => row.text || Object.keys(row.attrs).length)
+        };
+    }""" % {"items": json.dumps(", ".join((_BUTTON_SELECTOR, _OPTION_SELECTOR, '[role="menuitem"]')))}
+
+# Кнопки внутри модали: всего найдено + тексты видимых без повторов (innerText → aria-label → value)
+_MODAL_BUTTONS_JS = "(els) => {" + _JS_IS_VISIBLE + """
+        const texts = new Set();
+        for (const btn of els) {
+            if (!isVisible(btn)) continue;
+            const text = (btn.innerText || '').trim()
+                || (btn.getAttribute('aria-label') || '').trim()
+                || (btn.getAttribute('value') || '').trim();
+            if (text) texts.add(text.slice(0, 60));
+        }
+        return {total: els.length, texts: Array.from(texts)};
+    }"""
+
+# Ключевые поля формы одним page.evaluate: сначала textbox, потом searchbox (по 10 первых видимых),
+# у каждого label (for= / родительский label / aria-label / placeholder) и текущее значение
+_FORM_FIELDS_JS = "() => {" + _JS_IS_SHOWN + """
+        // id → первый label[for] в порядке документа: один обход вместо querySelector на каждое поле
+        const labelMap = new Map();
+        for (const l of document.querySelectorAll('label[for]')) {
+            if (!labelMap.has(l.htmlFor)) labelMap.set(l.htmlFor, l);
+        }
+        const field = elem => {
+        let label_text = '';
+        // Check for associated label via 'for' attribute
+        if (elem.id) {
+            const associated_label = labelMap.get(elem.id);
+            if (associated_label) {
+                label_text = associated_label.innerText.trim();
+            }
+        }
+        // Check for parent label
+        if (!label_text) {
+            const parent_label = elem.closest('label');
+            if (parent_label) {
+                label_text = parent_label.innerText.trim();
+            }
+        }
+        // aria-label, затем placeholder как fallback
+        if (!label_text) {
+            label_text = elem.getAttribute('aria-label') || elem.getAttribute('placeholder') || '';
+        }
+        return {
+            label: label_text.substring(0, 50),
+            value: typeof elem.value === 'string' ? elem.value.slice(0, 100) : ''
+        };
+        };
+        const pick = sel => Array.from(document.querySelectorAll(sel)).filter(isShown).slice(0, 10).map(field);
+        return [...pick(%(textbox)s), ...pick(%(searchbox)s)];
+    }""" % {"textbox": json.dumps(_TEXTBOX_SELECTOR), "searchbox": json.dumps(_SEARCHBOX_SELECTOR)}
+
+# 🚨 Модаль для _detect_modals за один page.evaluate: состояние окна и его кнопки сразу.
+# Метод 1 - первый видимый [role=dialog/alertdialog] высотой от 150px (меньше - не модаль);
+# метод 2 - то же по _MODAL_CLASS_SELECTOR с конца выборки (верхнее окно обычно последнее).
+# Кнопки (текст и aria-label видимых) - кандидаты для _find_modal_close_strategy. null - модали нет
+_MODAL_PROBE_JS = "() => {" + _JS_IS_VISIBLE + _JS_IS_SHOWN + """
+        const isModal = el => isVisible(el) && el.getBoundingClientRect().height >= 150;
+        const probe = (el, method) => ({
+            method: method,
+            text: el.innerText,
+            buttons: Array.from(el.querySelectorAll(%(button)s)).filter(isShown).map(b => ({
+                text: (b.innerText || '').trim(),
+                aria_label: b.getAttribute('aria-label') || ''
+            }))
+        });
+        // Модалки всегда в <body> - <head> не сканируем
+        const body = document.body || document;
+        for (const el of body.querySelectorAll(%(aria)s)) {
+            if (isModal(el)) return probe(el, 'aria');
+        }
+        const nodes = body.querySelectorAll(%(modal)s);
+        for (let i = nodes.length - 1; i >= 0; i--) {
+            if (isModal(nodes[i])) return probe(nodes[i], 'css');
+        }
+        return null;
+    }""" % {
+    "button": json.dumps(_BUTTON_SELECTOR),
+    "aria": json.dumps(_ARIA_DIALOG_SELECTOR),
+    "modal": json.dumps(_MODAL_CLASS_SELECTOR),
+}
+
+# Форматы строк search_hints: _get_search_hints копит записи (вид, *аргументы), строки собираются в конце
+_HINT_FMT: Dict[str, str] = {
+    "blank": "",
+    "player": "PLAYER: На странице загружен видеоплеер",
+    "player_tip": "  → Попробуй кликнуть на плеер или нажать пробел для запуска",
+    "fill_header": "🎯 ЗАПОЛНИ ПОЛЕ (перед кнопками!) используя FILL action:",
+    "fill": '  ➡️  {} → указать value="<текст для ввода>"',
+    "buttons_header": "BUTTONS (выбери одну из этих кнопок):",
+    "buttons_untitled": "(There are {} buttons but they have no visible text)",
+    "links_header": "LINKS (выбери одну из этих ссылок):",
+    "links_untitled": "(There are {} links but they have no visible text)",
+    "quoted_item": '  • "{}"',
+    "checkboxes": "There are {} checkboxes",
+    "radios": "There are {} radio buttons",
+    "selects": "There are {} dropdown selects",
+    "listbox": "LISTBOX/DROPDOWN: {} меню выбора",
+    "options_header": "⭐️ РЕЗУЛЬТАТЫ ПОИСКА (нажми на один из них):",
+    "option": "    • {}",
+    "dialog_header": "⚠️  MODAL DIALOG ОТКРЫТА: {} выбираемых элементов",
+    "dialog_warning": "   ⚠️  ВАЖНО: Выбери параметры ДО нажатия финальной кнопки!",
+    "dialog_item": "  • {}",
+    "dialog_item_attrs": "  • {} [{}]",
+    "popup_header": "⚠️  МОДАЛЬНОЕ ОКНО ОТКРЫТО: {} интерактивных элементов",
+    "popup_warning": "   ⚠️  ВАЖНО: Выбери ВСЕ параметры (размер/тип/добавки) ДО финальной кнопки!",
+    "popup_items_header": "   Элементы в модали:",
+    "popup_item": "      • {}",
+    "popup_item_attrs": "      • {} | {}",
+    "selection_header": "⚠️  СПИСОК ДЛЯ ВЫБОРА (выбери ОДИН элемент, не пиши текст):",
+    "modal_buttons_header": "🔴 КНОПКИ И ССЫЛКИ В МОДАЛЬНОМ ОКНЕ:",
+    "modal_button": '  ➡️  CLICK: strategy="text", args={{"text": "{}"}}',
+    "search_input": 'There is a search input field (placeholder="search")',
+    "dynamic": "Page content looks dynamic or dialog appears. Try scrolling or waiting.",
+}
+
+# Бюджет main_text (символов): дальше текст для LLM всё равно бесполезен, а по CDP он дорогой
+_MAIN_TEXT_BUDGET = 32768
+
+# Видимый текст без document.body.innerText (тот форсирует layout всей страницы и отдаёт мегабайты):
+# TreeWalker по текстовым узлам, видимость родителя кэшируется, остановка по бюджету
+_MAIN_TEXT_JS = """
+    (max) => {
+        if (!document.body) return '';
+        const visible = new Map();
+        const isShown = (el) => {
+            if (!el) return false;
+            let v = visible.get(el);
+            if (v === undefined) {
+                v = el.checkVisibility ? el.checkVisibility({checkVisibilityCSS: true, visibilityProperty: true}) : !!el.offsetParent;
+                visible.set(el, v);
+            }
+            return v;
+        };
+        const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+        const out = [];
+        let n = 0;
+        while (walker.nextNode()) {
+            const t = walker.currentNode.nodeValue.trim();
+            if (!t || !isShown(walker.currentNode.parentElement)) continue;
+            out.push(t);
+            n += t.length + 1;
+            if (n > max) break;
+        }
+        return out.join('\\n').substring(0, max);
+    }
+"""
+
+# 📸 СНИМОК СТРАНИЦЫ за один page.evaluate: модаль, поля, кнопки, заголовки, видео.
+# Модаль ищется по тем же правилам, что и _resolve_modal: последний видимый элемент _MODAL_SELECTOR.
+# Поля берутся внутри модали (если открыта), кнопки основной страницы - только без модали.
+_SNAPSHOT_JS = (
+    "() => {" + _JS_IS_VISIBLE + _JS_IS_SHOWN + _JS_INPUT_RECORD + _JS_BUTTON_LABEL + """
+        const modal = Array.from(document.querySelectorAll(%(modal)s)).filter(isVisible).pop() || null;
+        const root = modal || document;
+        const buttons = document.querySelectorAll(%(button)s);
+        // Поля поиска (как bounding_box(): только элементы с layout-боксами)
+        const searchRects = modal ? [] : Array.from(document.querySelectorAll(%(searchbox)s))
+            .filter(e => e.getClientRects().length > 0)
+            .map(e => e.getBoundingClientRect());
+        // Счётчики без скрытых элементов (как get_by_role: display/visibility и aria-hidden)
+        const counts = {};
+        for (const [key, sel] of Object.entries(%(counts)s)) {
+            let n = 0;
+            for (const el of document.querySelectorAll(sel)) {
+                if (isShown(el)) n++;
+            }
+            counts[key] = n;
+        }
+        // Как get_by_placeholder("search").first.is_visible(): первый элемент с "search" в placeholder (без регистра)
+        const searchByPlaceholder = Array.from(document.querySelectorAll('[placeholder]'))
+            .find(e => e.getAttribute('placeholder').toLowerCase().includes('search'));
+        // Заголовки одним проходом: только непустые и не больше 50 (страницы-простыни)
+        const headings = [];
+        for (const h of document.querySelectorAll('h1, h2, h3, h4, h5, h6')) {
+            const text = h.innerText.trim();
+            if (!text) continue;
+            headings.push({level: h.tagName.toLowerCase(), text: text});
+            if (headings.length >= 50) break;
+        }
+        const visibleButtons = Array.from(buttons).filter(isVisible);
+        return {
+            modal: !!modal,
+            inputs: Array.from(root.querySelectorAll(%(input)s)).filter(isVisible).map(inputRecord),
+            // Готовые строки кнопок: пустые и повторы отсеяны здесь
+            buttons: modal ? [] : Array.from(new Set(visibleButtons
+                .map(b => buttonLabel(b, searchRects))
+                .filter(Boolean))),
+            // Как прежний get_by_role("button").count(): скрытые кнопки не считаются
+            button_count: visibleButtons.length,
+            counts: counts,
+            has_search_input: !!searchByPlaceholder && isVisible(searchByPlaceholder),
+            headings: headings,
+            videos: document.querySelectorAll('video').length
+        };
+    }"""
+) % {
+    "modal": json.dumps(_MODAL_SELECTOR),
+    "button": json.dumps(_BUTTON_SELECTOR),
+    "input": json.dumps(_INPUT_SELECTOR),
+    "searchbox": json.dumps(_SEARCHBOX_SELECTOR),
+    "counts": json.dumps(_ROLE_COUNT_SELECTORS),
+}
+
+# Снимок живёт в странице как window.__sosixSnapshot: ставится init-скриптом контекста
+# (каждый новый документ получает его сразу), а по CDP каждый раз идёт только короткий вызов.
+_SNAPSHOT_INSTALL_JS = "window.__sosixSnapshot = " + _SNAPSHOT_JS + ";" + """
+    // Версия DOM: растёт на любой мутации и вводе - по ней analyze() понимает, что страница не менялась
+    (() => {
+        if (window.__sosixDomVersion !== undefined) return;
+        window.__sosixDomVersion = 0;
+        const bump = () => { window.__sosixDomVersion++; };
+        new MutationObserver(bump).observe(document, {
+            subtree: true, childList: true, attributes: true, characterData: true
+        });
+        document.addEventListener('input', bump, true);
+        document.addEventListener('change', bump, true);
+    })();
+"""
+_SNAPSHOT_CALL_JS = "() => typeof window.__sosixSnapshot === 'function' ? window.__sosixSnapshot() : null"
+# Отпечаток состояния: URL + сам документ (timeOrigin уникален на загрузку) + версия DOM
+# + хэш значений полей (запись el.value скриптом - не мутация, MutationObserver её не видит);
+# null - хелпер не установлен
+_SIGNATURE_JS = """() => {
+        if (window.__sosixDomVersion === undefined) return null;
+        let h = 0;
+        for (const el of document.querySelectorAll('input, textarea, select')) {
+            const v = el.value || '';
+            for (let i = 0; i < v.length; i++) h = (h * 31 + v.charCodeAt(i)) | 0;
+            h = (h * 31 + 1) | 0;  // граница поля: "ab"+"" != "a"+"b"
+        }
+        return [location.href, performance.timeOrigin, window.__sosixDomVersion, h];
+    }"""
+# Для документа, загруженного ДО установки init-скрипта
+_SNAPSHOT_INSTALL_AND_CALL_JS = "() => { " + _SNAPSHOT_INSTALL_JS + " return window.__sosixSnapshot(); }"
+
+# Пустой снимок - если evaluate упал (навигация посреди анализа и т.п.)
+_EMPTY_SNAPSHOT: Dict[str, Any] = {
+    "modal": False, "inputs": [], "buttons": [], "button_count": 0, "headings": [], "videos": 0,
+    "counts": dict.fromkeys(_ROLE_COUNT_SELECTORS, 0), "has_search_input": False,
+}
+
+
+# Типы элементов и стратегии локатора - небольшой фиксированный набор, интернируем один раз
+_ROLES = {k: sys.intern(k) for k in (
+    "button", "link", "input", "select", "textarea", "checkbox", "radio", "key_press", "unknown",
+)}
+_STRATS = {k: sys.intern(k) for k in (
+    "role", "text", "placeholder", "css", "aria-label", "label", "id",
+)}
+
+# Кнопка закрытия модали (стратегия 1): точный текст или подстрока aria-label, в нижнем регистре
+_CLOSE_EXACT = frozenset({"close", "x", "✕", "×"})
+_CLOSE_SUBSTR = ("close", "закрыть")
+# Тексты кнопок модали, которые её закрывают (стратегия 2), в нижнем регистре
+_MODAL_ACTION_TEXTS = frozenset({"cancel", "no", "отмена", "закрыть", "нет"})
+
+# ARIA роль (в нижнем регистре) → тип элемента для InteractiveElement
+_ROLE_TO_TYPE = {
+    **dict.fromkeys(('button', 'menuitem', 'menuitemcheckbox', 'menuitemradio', 'tab', 'treeitem'), 'button'),
+    **dict.fromkeys(('link', 'doc-link'), 'link'),
+    **dict.fromkeys(('textbox', 'searchbox'), 'input'),
+    'checkbox': 'checkbox',
+    'radio': 'radio',
+    **dict.fromkeys(('combobox', 'listbox', 'select'), 'select'),
+    'option': 'option',
+}
 
 
 class InteractiveElement:
@@ -23,10 +513,18 @@ class InteractiveElement:
     которые используются для построения Playwright locator.
     """
     
+    # Без __dict__ на экземпляр: на больших страницах элементов сотни
+    __slots__ = (
+        "id", "type", "text", "selector", "description",
+        "locator_strategy", "locator_args",
+        "can_click", "can_fill", "can_type",
+        "disabled_reason", "role",
+    )
+    
     def __init__(self, element_id: str, element_type: str, text: str, 
                  selector: str, description: str = ""):
         self.id = element_id
-        self.type = element_type  # button, link, input, select, textarea, checkbox, radio, etc.
+        self.type = _ROLES.get(element_type, element_type)  # button, link, input, select, textarea, checkbox, radio, etc.
         self.text = text  # Видимый текст элемента для пользователя
         self.selector = selector  # CSS selector (используется только для справки)
         self.description = description
@@ -124,8 +622,9 @@ class PageAnalysis:
         # 🎥 VIDEO ERROR DETECTION (YouTube)
         self.video_error: Optional[str] = None  # "error_tooltip", "reload_needed", "unavailable", etc.
         
-    def to_dict(self) -> Dict[str, Any]:
-        return {
+    def to_dict(self, compact: bool = False) -> Dict[str, Any]:
+        """compact=True - без пустых полей (пустые списки/строки, None, modal_open=False)"""
+        data = {
             "url": self.url,
             "title": self.title,
             "main_text": self.main_text,
@@ -137,9 +636,14 @@ class PageAnalysis:
             "modal_text": self.modal_text,
             "video_error": self.video_error
         }
+        if compact:
+            data = {k: v for k, v in data.items() if v}
+        return data
 
-    def to_json(self) -> str:
-        return json.dumps(self.to_dict(), indent=2, ensure_ascii=False)
+    def to_json(self, compact: bool = False) -> str:
+        if orjson is not None:
+            return orjson.dumps(self.to_dict(compact), option=orjson.OPT_INDENT_2).decode("utf-8")
+        return json.dumps(self.to_dict(compact), indent=2, ensure_ascii=False)
 
 
 class PageAnalyzer:
@@ -148,6 +652,26 @@ class PageAnalyzer:
     def __init__(self, page: Page):
         self.page = page
         self.element_counter = 0
+        # (modal_open, modal Locator) на время одного analyze(); None = ещё не проверяли
+        self._modal_cache: Optional[Tuple[bool, Optional[Locator]]] = None
+        # Установлен ли window.__sosixSnapshot init-скриптом контекста (один раз)
+        self._installed = False
+        # Последний анализ и отпечаток DOM, при котором он снят - если DOM не менялся, повторно не анализируем
+        self._last_sig: Optional[List[Any]] = None
+        self._last_analysis: Optional[PageAnalysis] = None
+        # Сильные ссылки на фоновые задачи (статистика), иначе их может собрать GC до завершения
+        self._bg_tasks: Set[asyncio.Task] = set()
+        # Локаторы ленивые (резолвятся при каждом вызове) - создаём один раз на страницу
+        self._modal_locator = page.locator(_MODAL_VISIBLE_SELECTOR)
+        self._modal_top = self._modal_locator.last  # верхнее окно обычно последнее
+        self._dialogs_locator = page.locator(_DIALOG_SELECTOR)
+        page.on("framenavigated", self._on_frame_navigated)
+
+    def _on_frame_navigated(self, frame) -> None:
+        """Навигация главного фрейма - прошлый анализ больше не годится"""
+        if frame == self.page.main_frame:
+            self._last_sig = None
+            self._last_analysis = None
 
     async def analyze(self) -> PageAnalysis:
         """
@@ -162,31 +686,59 @@ class PageAnalyzer:
         Returns:
             Объект PageAnalysis со структурированными данными
         """
+        # DOM не менялся с прошлого анализа - отдаём его же (одна короткая проверка вместо всего прохода)
+        sig = await self._page_signature()
+        if sig is not None and sig == self._last_sig and self._last_analysis is not None:
+            logger.debug("♻️ DOM не менялся - использую предыдущий анализ")
+            # Глубокая копия: списки hints/form_fields/headings у результатов и кэша не общие
+            analysis = copy.deepcopy(self._last_analysis)
+            analysis.url = self.page.url
+            return analysis
+        
         logger.analysis("Анализирую структуру страницы")
         
         analysis = PageAnalysis()
         analysis.url = self.page.url
-        analysis.title = await self._get_title()
+        self._modal_cache = None  # Новая страница/состояние - модалку ищем заново
         
-        # 1. Get main content - ВСЕ видимый текст
-        analysis.main_text = await self._get_main_text()
+        # 0. Снимок DOM одним evaluate: модаль, поля, кнопки, заголовки, видео
+        snapshot = await self._take_snapshot()
+        analysis.headings = snapshot["headings"]
         
-        # 2. v2: НЕ собираем элементы, собираем HINTS как их найти
+        # 1-4. Независимые запросы к странице - параллельно, одним пакетом по WebSocket:
+        # title, main_text (ВСЕ видимый текст), HINTS как найти элементы, ключевые поля формы
         # interactive_elements остаётся пусто (для новой модели это переписано в ActionExecutor)
         analysis.interactive_elements = []
-        analysis.search_hints = await self._get_search_hints()
-        
-        # 3. Find headings
-        analysis.headings = await self._get_headings()
+        (
+            analysis.title,
+            analysis.main_text,
+            analysis.search_hints,
+            analysis.form_fields,
+        ) = await asyncio.gather(
+            self._get_title(),
+            self._get_main_text(),
+            self._get_search_hints(snapshot),
+            self._identify_key_form_fields(),
+        )
         
-        # 4. Detect form fields (ключевые)
-        analysis.form_fields = await self._identify_key_form_fields()
+        # 5. Log page stats - в фоне, анализ возвращаем не дожидаясь (и только если есть что печатать).
+        # Текст и подсказки уже собраны - запускаем до поиска модали, чтобы их запросы шли параллельно
+        if logger.dom_enabled() or analysis.video_error:
+            task = asyncio.create_task(self._log_page_stats(analysis))
+            self._bg_tasks.add(task)
+            task.add_done_callback(self._bg_tasks.discard)
         
-        # 5. 🚨 DETECT MODAL WINDOWS (ВАЖНО: ДО анализа основного контента!)
+        # 6. 🚨 DETECT MODAL WINDOWS (ВАЖНО: ДО анализа основного контента!)
         await self._detect_modals(analysis)
         
-        # 6. Log page stats
-        await self._log_page_stats(analysis)
+        # Кэш модали живёт только один проход - следующий analyze() увидит свежий DOM
+        self._modal_cache = None
+        
+        # Отпечаток снят ДО анализа: мутации во время прохода дадут новую версию и повторный анализ.
+        # Анализ по пустому снимку (evaluate упал) не кэшируем - иначе он жил бы до следующей мутации
+        if not snapshot.get("fallback"):
+            self._last_sig = sig
+            self._last_analysis = copy.deepcopy(analysis)  # вызывающий код может менять свой результат
         
         logger.success(f"Анализ завершен. Найдено {len(analysis.search_hints)} подсказок для действий")
         
@@ -196,134 +748,102 @@ class PageAnalyzer:
         """Get page title"""
         try:
             return await self.page.title()
-        except:
+        except PWError:
             return ""
 
     async def _get_main_text(self) -> str:
         """
-        Получить видимый текст со страницы используя Playwright.
-        ВАЖНО: используем Playwright встроенные методы вместо ручного парсинга HTML.
+        Получить видимый текст со страницы (не больше _MAIN_TEXT_BUDGET символов).
+        ВАЖНО: обходим текстовые узлы в браузере вместо ручного парсинга HTML.
         """
         try:
-            # Use Playwright's built-in innerText which respects CSS visibility
-            # This is MUCH better than parsing HTML manually
-            text = await self.page.evaluate("() => document.body.innerText")
+            # TreeWalker с проверкой видимости родителя - без полного reflow от innerText
+            text = await self.page.evaluate(_MAIN_TEXT_JS, _MAIN_TEXT_BUDGET)
             return text if text else ""
         except Exception as e:
             logger.error(f"Error getting main text: {e}")
             return ""
 
+    async def _page_signature(self) -> Optional[List[Any]]:
+        """Отпечаток DOM (URL, документ, версия мутаций) или None если хелпер ещё не установлен"""
+        try:
+            return await self.page.evaluate(_SIGNATURE_JS)
+        except Exception:
+            return None
+
+    async def _take_snapshot(self) -> Dict[str, Any]:
+        """
+        Снять снимок DOM одним page.evaluate (window.__sosixSnapshot) вместо сотен вызовов по CDP.
+        Заодно заполняет кэш модали, чтобы _resolve_modal не ходил в браузер повторно.
+        """
+        try:
+            if not self._installed:
+                await self.page.context.add_init_script(_SNAPSHOT_INSTALL_JS)
+                self._installed = True
+            snapshot = await self.page.evaluate(_SNAPSHOT_CALL_JS)
+            if snapshot is None:
+                # Текущий документ загружен раньше init-скрипта - ставим хелпер вручную
+                snapshot = await self.page.evaluate(_SNAPSHOT_INSTALL_AND_CALL_JS)
+        except Exception as e:
+            if logger.debug_enabled():
+                logger.debug(f"⚠️ Не удалось снять снимок страницы: {str(e)[:80]}")
+            # Свои списки на каждый вызов (headings уходит в результат как есть)
+            return {**copy.deepcopy(_EMPTY_SNAPSHOT), "fallback": True}
+        
+        if snapshot.get("modal"):
+            self._modal_cache = (True, self._modal_top)
+        else:
+            self._modal_cache = (False, None)
+        return snapshot
+
+    async def _resolve_modal(self) -> Tuple[bool, Optional[Locator]]:
+        """
+        Найти видимое модальное окно: (открыто ли, его локатор).
+        
+        Один count() по объединённому селектору _MODAL_VISIBLE_SELECTOR (dialog + CSS-классы, только видимые).
+        Берем ПОСЛЕДНИЙ элемент (обычно он поверх всех).
+        
+        Результат кэшируется на время одного analyze() - повторные проверки не ходят в браузер.
+        """
+        if self._modal_cache is not None:
+            return self._modal_cache
+        
+        result: Tuple[bool, Optional[Locator]] = (False, None)
+        try:
+            count = await self._modal_locator.count()
+            if count > 0:
+                logger.debug(f"✅ Модальное окно найдено (видимых кандидатов: {count})")
+                result = (True, self._modal_top)
+            else:
+                logger.debug("✓ Видимое модальное окно не обнаружено")
+        except Exception as e:
+            if logger.debug_enabled():
+                logger.debug(f"Ошибка при проверке модального окна: {e}")
+        
+        self._modal_cache = result
+        return result
+
     async def _check_modal_visible(self) -> bool:
         """
         Быстрая проверка: есть ли видимое модальное окно на странице?
         
-        ИСПОЛЬЗУЕТСЯ ЛУЧШИЙ СПОСОБ:
-        1. Ищем по role="dialog" и проверяем видимость
-        2. Проверяем CSS-селекторы как fallback
-        3. Проверяем что элемент действительно видим
-        
         Returns:
             True если найдено видимое модальное окно, False в противном случае
         """
-        try:
-            # ========== СПОСОБ 1: Поиск по ARIA role (САМЫЙ ПРАВИЛЬНЫЙ ПУТЬ) ==========
-            # Большинство современных библиотек (React, Vue, Bootstrap) вешают на модалки роль dialog
-            # Проверяем видимость каждого найденного диалога
-            try:
-                # Ищем видимое диалоговое окно
-                dialog_locator = self.page.get_by_role("dialog")
-                count = await dialog_locator.count()
-                
-                if count > 0:
-                    # Проверяем первый диалог на видимость
-                    first_dialog = dialog_locator.first
-                    if await first_dialog.is_visible():
-                        logger.debug(f"✅ Модальное окно найдено по role='dialog' (найдено {count})")
-                        return True
-            except Exception as e:
-                logger.debug(f"  ⚠️ Ошибка при поиске по role='dialog': {str(e)[:50]}")
-                pass
-            
-            # ========== СПОСОБ 2: Универсальный CSS-селектор (для старых сайтов) ==========
-            # Если сайт старый или не следует стандартам доступности
-            # Ищем по характерным классам или атрибутам, проверяя видимость
-            try:
-                # Селектор перебирает частые названия классов и атрибутов
-                modal_selector = 'div[class*="modal"], div[class*="popup"], [role="dialog"], .fade.show'
-                modal_locator = self.page.locator(modal_selector)
-                count = await modal_locator.count()
-                
-                if count > 0:
-                    # Проверяем последний элемент (обычно он поверх всех)
-                    last_modal = modal_locator.last
-                    if await last_modal.is_visible():
-                        logger.debug(f"✅ Модальное окно найдено по CSS селектору (найдено {count})")
-                        return True
-            except Exception as e:
-                logger.debug(f"  ⚠️ Ошибка при поиске по CSS селектору: {str(e)[:50]}")
-                pass
-            
-            # Если ничего не найдено
-            logger.debug("✓ Видимое модальное окно не обнаружено")
-            return False
-            
-        except Exception as e:
-            logger.debug(f"Ошибка при проверке модального окна: {e}")
-            return False
+        is_open, _ = await self._resolve_modal()
+        return is_open
     
     async def _get_modal_locator(self) -> Optional[Locator]:
         """
         Получить локатор видимого модального окна.
         
-        ИСПОЛЬЗУЕТСЯ ЛУЧШИЙ СПОСОБ:
-        1. Ищем по role="dialog" и проверяем видимость
-        2. Fallback на CSS-селекторы
-        3. Берем ПОСЛЕДНИЙ элемент (обычно он поверх всех)
-        
         Returns:
             Locator модального окна или None если модаль не открыта
         """
-        try:
-            # ========== МЕТОД 1: Поиск по ARIA role (САМЫЙ НАДЕЖНЫЙ) ==========
-            # Большинство библиотек используют role="dialog"
-            try:
-                dialog_locator = self.page.get_by_role("dialog")
-                count = await dialog_locator.count()
-                
-                if count > 0:
-                    # Проверяем видимость первого диалога
-                    first_dialog = dialog_locator.first
-                    if await first_dialog.is_visible():
-                        logger.debug(f"✅ Получен локатор модали по role='dialog' (найдено {count})")
-                        return first_dialog
-            except Exception as e:
-                logger.debug(f"  ⚠️ Ошибка метода 1 (role='dialog'): {str(e)[:50]}")
-                pass
-            
-            # ========== МЕТОД 2: Поиск по CSS классам (для старых сайтов) ==========
-            try:
-                # Селектор перебирает частые названия классов и атрибутов
-                modal_selector = 'div[class*="modal"], div[class*="popup"], [role="dialog"], .fade.show'
-                modal_locator = self.page.locator(modal_selector)
-                count = await modal_locator.count()
-                
-                if count > 0:
-                    # Берем ПОСЛЕДНИЙ элемент (обычно он поверх всех) и проверяем видимость
-                    last_modal = modal_locator.last
-                    if await last_modal.is_visible():
-                        logger.debug(f"✅ Получен локатор модали по CSS селектору (найдено {count})")
-                        return last_modal
-            except Exception as e:
-                logger.debug(f"  ⚠️ Ошибка метода 2 (CSS селектор): {str(e)[:50]}")
-                pass
-            
-            logger.debug("⚠️ Модальное окно не найдено")
-            return None
-        except Exception as e:
-            logger.debug(f"Ошибка при получении локатора модали: {e}")
-            return None
+        _, modal_locator = await self._resolve_modal()
+        return modal_locator
 
-    async def _get_search_hints(self) -> List[str]:
+    async def _get_search_hints(self, snapshot: Optional[Dict[str, Any]] = None) -> List[str]:
         """
         Возвращает СТРУКТУРИРОВАННЫЙ СПИСОК активных элементов на странице.
         Модель ДОЛЖНА выбирать из этого списка, а не придумывать имена!
@@ -336,9 +856,13 @@ class PageAnalyzer:
         
         ⚠️  ВАЖНО: Если открыто модальное окно, внизу мы вернем ТОЛЬКО элементы модали!
         """
-        hints: List[str] = []
+        # Подсказки копим как (вид, *аргументы) и форматируем один раз в конце по _HINT_FMT
+        records: List[Tuple[Any, ...]] = []
         
         try:
+            if snapshot is None:
+                snapshot = await self._take_snapshot()
+            
             # ========== PRECHECK: Есть ли модальное окно? ==========
             # Проверяем в НАЧАЛО, чтобы потом знать - добавлять ли элементы основной страницы
             modal_window_open = await self._check_modal_visible()
@@ -352,218 +876,97 @@ class PageAnalyzer:
             
             # Если есть модальное окно - пропускаем видео плеер основной страницы
             if not modal_window_open:
-                try:
-                    # Проверить наличие <video> элемента используя evaluate (Playwright правильный способ)
-                    video_count = await self.page.evaluate("() => document.querySelectorAll('video').length")
-                    if video_count > 0:
-                        has_video = True
-                except:
-                    pass
+                # Количество <video> уже в снимке
+                has_video = snapshot["videos"] > 0
                 
                 if has_video:
-                    hints.append("PLAYER: На странице загружен видеоплеер")
-                    hints.append("  → Попробуй кликнуть на плеер или нажать пробел для запуска")
-                    hints.append("")  # Empty line
+                    records.append(("player",))
+                    records.append(("player_tip",))
+                    records.append(("blank",))  # Empty line
             
             # ========== 1️⃣ INPUT FIELDS - ПЕРВЫМИ! (ПЕРЕД КНОПКАМИ!) ==========
             # ВАЖНО: input fields должны быть первыми потому что часто нужно ввести текст ДО нажатия кнопки
             # ТАКЖЕ: ищем поля ВНУТРИ модального окна если оно открыто!
             
             input_info = []
+            input_seen: Set[str] = set()  # Дедупликация за O(1) вместо поиска по списку
             
             # ========== 1a️⃣ INPUT FIELDS ВНУТРИ МОДАЛЬНОГО ОКНА ==========
             if modal_window_open:
                 try:
-                    modal_locator = await self._get_modal_locator()
-                    if modal_locator:
-                        # Ищем input поля ВНУТРИ модали
-                        input_locator = modal_locator.locator('input:not([type="hidden"]), textarea, [contenteditable="true"]')
-                        modal_inputs = await input_locator.all()
-                        logger.debug(f"🔍 INPUT FIELDS ВНУТРИ МОДАЛИ: найдено {len(modal_inputs)} полей")
+                    # Снимок уже собрал input поля ВНУТРИ модали
+                    modal_inputs = snapshot["inputs"]
+                    logger.debug(f"🔍 INPUT FIELDS ВНУТРИ МОДАЛИ: найдено {len(modal_inputs)} видимых полей")
+                    
+                    for field in modal_inputs:
+                        # editable уже посчитан в снимке - ни одного лишнего await
+                        if not field["editable"]:
+                            continue
+                        
+                        # В модали ищем только по placeholder / aria-label (стратегия выбрана в снимке)
+                        strategy = field["strategy"]
+                        if strategy not in ("placeholder", "aria-label"):
+                            continue
+                        value = field["value"]
+                        # Определяем назначение поля (выбор города, поиск и т.д.)
+                        field_context = field["context"]
                         
-                        for input_elem in modal_inputs:
-                            try:
-                                is_visible = await input_elem.is_visible()
-                                if not is_visible:
-                                    continue
-                                
-                                placeholder = (await input_elem.get_attribute("placeholder")) or ""
-                                aria_label = (await input_elem.get_attribute("aria-label")) or ""
-                                
-                                # Определяем назначение поля (выбор города, поиск и т.д.)
-                                field_context = ""
-                                try:
-                                    parent_text = await input_elem.evaluate("""
-                                        el => {
-                                            let text = "";
-                                            if (el.labels && el.labels[0]) { text = el.labels[0].innerText; }
-                                            if (!text && el.parentElement) { text = el.parentElement.innerText?.split(el.value)[0] || ""; }
-                                            return text.trim().substring(0, 100);
-                                        }
-                                    """)
-                                    if parent_text:
-                                        field_context = parent_text
-                                except:
-                                    pass
-                                
-                                if placeholder:
-                                    strategy = "placeholder"
-                                    value = placeholder
-                                elif aria_label:
-                                    strategy = "aria-label"
-                                    value = aria_label
-                                else:
-                                    continue
-                                
-                                hint_str = f'FILL: {field_context or "поле ввода"} | strategy="{strategy}", args={{"{strategy}": "{value[:40]}"}}'
-                                if hint_str not in input_info:
-                                    input_info.append(hint_str)
-                                    logger.debug(f"   ✅ Найдено поле в модали: {hint_str[:80]}")
-                            except:
-                                pass
+                        hint_str = f'FILL: {field_context or "поле ввода"} | strategy="{strategy}", args={{"{strategy}": "{value[:40]}"}}'
+                        if hint_str not in input_seen:
+                            input_seen.add(hint_str)
+                            input_info.append(hint_str)
+                            if logger.debug_enabled():
+                                logger.debug(f"   ✅ Найдено поле в модали: {hint_str[:80]}")
                 except Exception as e:
-                    logger.debug(f"⚠️  Ошибка при поиске input полей в модали: {str(e)[:50]}")
+                    if logger.debug_enabled():
+                        logger.debug(f"⚠️  Ошибка при поиске input полей в модали: {str(e)[:50]}")
             
             # ========== 1b️⃣ INPUT FIELDS НА СТРАНИЦЕ (если модали нет) ==========
             if not modal_window_open:
                 try:
-                    input_locator = self.page.locator('input:not([type="hidden"]), textarea, [contenteditable="true"]')
-                    all_inputs = await input_locator.all()
-                    logger.debug(f"🔍 INPUT FIELDS на странице: найдено {len(all_inputs)} полей")
+                    # 🎯 Видимость, editable и все атрибуты - уже в снимке, без ~8 вызовов на поле
+                    all_inputs = snapshot["inputs"]
+                    logger.debug(f"🔍 INPUT FIELDS на странице: найдено {len(all_inputs)} видимых полей")
                     
-                    for input_elem in all_inputs:
-                        try:
-                            # Проверяем видимость элемента
-                            is_visible = await input_elem.is_visible()
-                            if not is_visible:
-                                continue
-                            
-                            # Проверяем editable (чтобы не включать read-only поля)
-                            is_editable = await input_elem.is_editable()
-                            if not is_editable:
-                                # Для contenteditable, нужно проверить по-другому
-                                try:
-                                    is_contenteditable = await input_elem.evaluate("el => el.contentEditable === 'true'")
-                                    if not is_contenteditable:
-                                        continue
-                                except:
-                                    continue
-                            
-                            # 🎯 Собираем данные через нативный Playwright API (надежнее)
-                            placeholder = (await input_elem.get_attribute("placeholder")) or ""
-                            aria_label = (await input_elem.get_attribute("aria-label")) or ""
-                            element_id = (await input_elem.get_attribute("id")) or ""
-                            input_type = (await input_elem.get_attribute("type")) or "text"
-                            
-                            # Получаем связанный <label> если есть
-                            label_text = ""
-                            try:
-                                label_text = await input_elem.evaluate("el => el.labels?.[0]?.innerText || ''")
-                            except:
-                                pass
-                            
-                            # Определяем лучшую стратегию для поиска этого поля
-                            strategy_to_use = None
-                            strategy_value = None
-                            
-                            # Приоритет: placeholder > aria-label > label > id
-                            if placeholder:
-                                strategy_to_use = "placeholder"
-                                strategy_value = placeholder
-                            elif aria_label:
-                                strategy_to_use = "aria-label"
-                                strategy_value = aria_label
-                            elif label_text:
-                                strategy_to_use = "label"
-                                strategy_value = label_text
-                            elif element_id:
-                                strategy_to_use = "id"
-                                strategy_value = element_id
-                            else:
-                                # Fallback: try to get the tag name
-                                tag_name = await input_elem.evaluate("el => el.tagName.toLowerCase()")
-                                if tag_name == "textarea":
-                                    strategy_to_use = "role"
-                                    strategy_value = "textbox"
-                                else:
-                                    continue  # Skip if no identifiable attribute
-                            
-                            # 🎯 Попробуем получить КОНТЕКСТ поля - что рядом?
-                            field_context = ""
-                            try:
-                                # Смотрим текст в родительском контейнере (обычно там лейбл или подсказка)
-                                parent_text = await input_elem.evaluate("""
-                                    el => {
-                                        // Ищем текст рядом с инпутом
-                                        let text = "";
-                                        // 1. Ищем сам лейбл если он связан
-                                        if (el.labels && el.labels[0]) {
-                                            text = el.labels[0].innerText;
-                                        }
-                                        // 2. Если нет - ищем в близком родителе (обычно div с лейблом)
-                                        if (!text && el.parentElement) {
-                                            text = el.parentElement.innerText?.split(el.value)[0] || "";
-                                        }
-                                        return text.trim().substring(0, 100);
-                                    }
-                                """)
-                                if parent_text:
-                                    field_context = parent_text
-                            except:
-                                pass
-                            
-                            # 🎯 Ищем варианты/подсказки которые могли бы быть списком выбора (select, dropdown, autocomplete)
-                            options_context = ""
-                            try:
-                                options_list = await input_elem.evaluate("""
-                                    el => {
-                                        let options = [];
-                                        
-                                        // Если это select
-                                        if (el.tagName === 'SELECT') {
-                                            options = Array.from(el.options).slice(0, 5).map(o => o.text);
-                                        }
-                                        
-                                        // Если это input с datalist
-                                        if (el.getAttribute('list')) {
-                                            let datalist = document.getElementById(el.getAttribute('list'));
-                                            if (datalist) {
-                                                options = Array.from(datalist.options || datalist.children)
-                                                    .slice(0, 5)
-                                                    .map(o => o.text || o.value);
-                                            }
-                                        }
-                                        
-                                        return options.filter(o => o).slice(0, 3);
-                                    }
-                                """)
-                                if options_list:
-                                    options_context = f" [ВАРИАНТЫ: {', '.join(options_list[:3])}]"
-                            except:
-                                pass
-                            
-                            # 🎯 Создаем ИНФОРМАТИВНЫЙ хинт с контекстом
-                            if field_context:
-                                # Используем контекст если он есть (лейбл, родительский текст)
-                                hint_str = f'FILL: {field_context} | strategy="{strategy_to_use}", args={{"{strategy_to_use}": "{strategy_value[:40]}"}} {options_context}'
-                            else:
-                                # Fallback на базовый формат
-                                hint_str = f'FILL: strategy="{strategy_to_use}", args={{"{strategy_to_use}": "{strategy_value[:60]}"}} {options_context}'
-                            
-                            if hint_str not in input_info:  # Избегаем дубликатов
-                                input_info.append(hint_str)
-                                logger.debug(f"   ✅ Найдено поле: {hint_str[:100]}")
+                    for field in all_inputs:
+                        # editable уже посчитан в снимке (read-only/disabled поля отсекаем; contenteditable считается)
+                        if not field["editable"]:
+                            continue
+                        
+                        # Лучшая стратегия уже выбрана в снимке (placeholder > aria-label > label > id > textarea-role)
+                        strategy_to_use = field["strategy"]
+                        strategy_value = field["value"]
+                        if not strategy_to_use:
+                            continue  # Skip if no identifiable attribute
+                        
+                        # 🎯 КОНТЕКСТ поля - лейбл или текст родительского контейнера
+                        field_context = field["context"]
+                        
+                        # 🎯 Варианты/подсказки (select, datalist)
+                        options_context = ""
+                        if field["options"]:
+                            options_context = f" [ВАРИАНТЫ: {', '.join(field['options'][:3])}]"
                         
-                        except Exception as e:
-                            logger.debug(f"   ⚠️  Ошибка при обработке input элемента: {str(e)[:50]}")
-                            pass
+                        # 🎯 Создаем ИНФОРМАТИВНЫЙ хинт с контекстом
+                        if field_context:
+                            # Используем контекст если он есть (лейбл, родительский текст)
+                            hint_str = f'FILL: {field_context} | strategy="{strategy_to_use}", args={{"{strategy_to_use}": "{strategy_value[:40]}"}} {options_context}'
+                        else:
+                            # Fallback на базовый формат
+                            hint_str = f'FILL: strategy="{strategy_to_use}", args={{"{strategy_to_use}": "{strategy_value}"}} {options_context}'
+                        
+                        if hint_str not in input_seen:  # Избегаем дубликатов
+                            input_seen.add(hint_str)
+                            input_info.append(hint_str)
+                            if logger.debug_enabled():
+                                logger.debug(f"   ✅ Найдено поле: {hint_str[:100]}")
                     
                     # Выводим найденные поля
                     if input_info:
-                        hints.append("🎯 ЗАПОЛНИ ПОЛЕ (перед кнопками!) используя FILL action:")
+                        records.append(("fill_header",))
                         for input_desc in input_info:
-                            hints.append(f'  ➡️  {input_desc} → указать value="<текст для ввода>"')
-                        hints.append("")  # Empty line after inputs
+                            records.append(("fill", input_desc))
+                        records.append(("blank",))  # Empty line after inputs
                     else:
                         logger.warning("⚠️  НЕ НАЙДЕНЫ INPUT ПОЛЯ на странице!")
                 
@@ -571,482 +974,62 @@ class PageAnalyzer:
                     logger.error(f"❌ Ошибка при поиске input полей: {str(e)[:100]}")
             
             # ========== 2️⃣ КНОПКИ - ВТОРОЙ РАЗДЕЛ (ПОСЛЕ INPUT!) ==========
-            buttons_count = await self.page.get_by_role("button").count()
+            buttons_count = snapshot["button_count"]
             if buttons_count > 0 and not modal_window_open:  # ТОЛЬКО если нет модального окна
-                button_list = []
-                try:
-                    buttons = await self.page.get_by_role("button").all()
-                    
-                    # Найти input поля поиска один раз
-                    search_inputs = []
-                    try:
-                        searchboxes = await self.page.get_by_role("searchbox").all()
-                        search_inputs.extend(searchboxes)
-                    except:
-                        pass
-                    
-                    for btn in buttons:
-                        # Получить основной текст кнопки (первая строка)
-                        main_text = await btn.evaluate("""
-                            elem => {
-                                let text = elem.innerText || elem.textContent;
-                                if (!text) return '';
-                                // Take first line only
-                                let first_line = text.split('\\n')[0].trim();
-                                return first_line;
-                            }
-                        """)
-                        
-                        # Получить aria-label, title, ID и кастомные атрибуты
-                        button_info = await btn.evaluate("""elem => {
-                            let info = {
-                                aria_label: elem.getAttribute('aria-label') || '',
-                                title: elem.getAttribute('title') || '',
-                                id: elem.getAttribute('id') || '',
-                                data_attrs: {}
-                            };
-                            // Собрать все data-* атрибуты
-                            for (let attr of elem.attributes) {
-                                if (attr.name.startsWith('data-')) {
-                                    info.data_attrs[attr.name] = attr.value;
-                                }
-                            }
-                            return info;
-                        }""")
-                        
-                        aria_label = button_info.get('aria_label', '')
-                        title_attr = button_info.get('title', '')
-                        element_id = button_info.get('id', '')
-                        data_attrs = button_info.get('data_attrs', {})
-                        
-                        # Определить отображаемый текст - приоритет: видимый текст → aria-label → title → ID
-                        display_text = main_text.strip() if main_text and main_text.strip() else ""
-                        
-                        # Если нет видимого текста, использовать aria-label или title
-                        if not display_text:
-                            if aria_label and aria_label.strip():
-                                display_text = f"[aria-label] {aria_label.strip()}"
-                            elif title_attr and title_attr.strip():
-                                display_text = f"[title] {title_attr.strip()}"
-                            elif element_id and element_id.strip():
-                                display_text = f"[id] {element_id.strip()}"
-                        
-                        # Пропустить если совсем нет текста
-                        if not display_text:
-                            continue
-                        
-                        cleaned_text = display_text[:80]  # 80 chars max for readability
-                        
-                        # Проверить: находится ли эта кнопка рядом с input полем поиска?
-                        is_search_button = False
-                        if search_inputs:
-                            try:
-                                btn_rect = await btn.bounding_box()
-                                if btn_rect:
-                                    # Проверить близость к input полям (максимум 200px по горизонтали)
-                                    for search_input in search_inputs:
-                                        input_rect = await search_input.bounding_box()
-                                        if input_rect:
-                                            horizontal_distance = abs(btn_rect['x'] - (input_rect['x'] + input_rect['width']))
-                                            # Если кнопка находится справа от input в пределах 200px - это кнопка отправки
-                                            if horizontal_distance < 200 and btn_rect['y'] >= input_rect['y'] - 20 and btn_rect['y'] <= input_rect['y'] + input_rect['height'] + 20:
-                                                is_search_button = True
-                                                break
-                            except:
-                                pass
-                        
-                        # Добавить в список с пометкой если это кнопка отправки
-                        if is_search_button:
-                            final_text = f"[SUBMIT] {cleaned_text}"
-                        else:
-                            final_text = cleaned_text
-                        
-                        # Добавить информацию о кастомных атрибутах если они есть
-                        if data_attrs:
-                            attr_str = " ".join([f'{k}="{v}"' for k, v in data_attrs.items()])
-                            final_text = f'{final_text} ({attr_str[:60]})'
-                        
-                        if final_text not in button_list:  # Avoid duplicates
-                            button_list.append(final_text)
-                except:
-                    pass
+                # Видимые кнопки уже готовыми строками ([SUBMIT], data-*), без пустых и повторов - всё в снимке
+                button_list = snapshot["buttons"]
                 
                 if button_list:
-                    hints.append("BUTTONS (выбери одну из этих кнопок):")
+                    records.append(("buttons_header",))
                     for btn_text in button_list:
-                        hints.append(f'  • "{btn_text}"')
+                        records.append(("quoted_item", btn_text))
                 else:
-                    hints.append(f"(There are {buttons_count} buttons but they have no visible text)")
+                    records.append(("buttons_untitled", buttons_count))
 
             
-            # ========== 3️⃣ ССЫЛКИ - ТРЕТИЙ РАЗДЕЛ ==========
-            links_count = await self.page.get_by_role("link").count()
-            if links_count > 0 and not modal_window_open:  # ТОЛЬКО если нет модального окна
-                link_list = []
-                try:
-                    links = await self.page.get_by_role("link").all()
-                    for link in links:
-                        # Получить ОСНОВНОЙ текст ссылки (первая строка)
-                        main_text = await link.evaluate("""
-                            elem => {
-                                let text = elem.innerText || elem.textContent;
-                                if (!text) return '';
-                                // Take first line only
-                                let first_line = text.split('\\n')[0].trim();
-                                return first_line;
-                            }
-                        """)
-                        
-                        if main_text and main_text.strip() and len(main_text.strip()) > 2:  # Skip empty or very short
-                            # Также попытаться получить дополнительный контекст (платформа, автор)
-                            context = await link.evaluate("""
-                                elem => {
-                                    // Попытаться найти контекст (YouTube, ВКонтакте и т.д.)
-                                    let context_text = '';
-                                    
-                                    // Ищем текст вроде "YouTube ·", "ВКонтакте", "25 мая 2017"
-                                    let all_text = (elem.innerText || elem.textContent || '').split('\\n');
-                                    
-                                    // Обычно контекст во второй и третьей строке
-                                    if (all_text.length > 1) {
-                                        // Собираем вторую и третью строки как контекст
-                                        context_text = all_text.slice(1, 3).join(' · ').trim();
-                                    }
-                                    
-                                    return context_text;
-                                }
-                            """)
-                            
-                            cleaned_text = main_text.strip()[:60]  # 60 chars max
-                            
-                            # Создаём уникальный ключ (текст + контекст)
-                            display_text = cleaned_text
-                            if context and context.strip() and len(context.strip()) > 2:
-                                display_text = f"{cleaned_text} ({context.strip()[:40]})"
-                            
-                            if display_text not in link_list:  # Avoid duplicates
-                                link_list.append(display_text)
-                except:
-                    pass
-                
-                if link_list:
-                    hints.append("")  # Empty line for readability
-                    hints.append("LINKS (выбери одну из этих ссылок):")
-                    for link_text in link_list:
-                        hints.append(f'  • "{link_text}"')
-                else:
-                    hints.append(f"(There are {links_count} links but they have no visible text)")
+            # ========== 3️⃣ / 5.5️⃣ / 6️⃣ / 6.5️⃣ Разделы, которым нужен браузер ==========
+            # Независимые read-only запросы - запускаем параллельно (CDP мультиплексируется
+            # по одному соединению), а записи склеиваем в прежнем порядке
+            counts = snapshot["counts"]
+            link_records, listbox_records, dialog_records, modal_button_records = await asyncio.gather(
+                self._section_links(counts, modal_window_open),
+                self._section_listbox(counts, modal_window_open),
+                self._section_dialogs(counts),
+                self._section_modal_buttons(modal_window_open),
+            )
+            
+            records.extend(link_records)
             
             # ========== 4️⃣ ЧЕКБОКСЫ И РАДИО ==========
-            checkbox_count = await self.page.get_by_role("checkbox").count()
-            radio_count = await self.page.get_by_role("radio").count()
+            checkbox_count = counts["checkboxes"]
+            radio_count = counts["radios"]
             
             if checkbox_count > 0 and not modal_window_open:
-                hints.append(f'There are {checkbox_count} checkboxes')
+                records.append(("checkboxes", checkbox_count))
             
             if radio_count > 0 and not modal_window_open:
-                hints.append(f'There are {radio_count} radio buttons')
+                records.append(("radios", radio_count))
             
             # ========== 5️⃣ Проверить SELECTS ==========
-            select_count = await self.page.get_by_role("combobox").count()
+            select_count = counts["selects"]
             if select_count > 0 and not modal_window_open:
-                hints.append(f'There are {select_count} dropdown selects')
+                records.append(("selects", select_count))
             
-            # ========== 5.5️⃣ Проверить LISTBOX (выпадающие меню) ==========
-            if not modal_window_open:  # ТОЛЬКО на основной странице
-                try:
-                    listbox_count = await self.page.get_by_role("listbox").count()
-                    if listbox_count > 0:
-                        hints.append(f'LISTBOX/DROPDOWN: {listbox_count} меню выбора')
-                        
-                        # Попробать собрать опции
-                        try:
-                            options = await self.page.get_by_role("option").all()
-                            if options:
-                                option_texts = []
-                                for opt in options[:15]:  # First 15 options only
-                                    try:
-                                        opt_text = await opt.text_content()
-                                        opt_text = opt_text.strip() if opt_text else ""
-                                        
-                                        # Собрать кастомные атрибуты
-                                        custom_attrs = await opt.evaluate("""elem => {
-                                            let attrs = {};
-                                            for (let attr of elem.attributes) {
-                                                if (attr.name.startsWith('data-') || attr.name === 'value' || attr.name === 'id') {
-                                                    attrs[attr.name] = attr.value;
-                                                }
-                                            }
-                                            return attrs;
-                                        }""")
-                                        
-                                        # Форматировать вывод с явным указанием стратегии КЛИКА
-                                        if opt_text:
-                                            # Если есть ID - покажи как кликать через ID
-                                            if 'id' in custom_attrs:
-                                                opt_desc = f'CLICK: strategy="id", args={{"id": "{custom_attrs["id"]}"}} → {opt_text[:35]}'
-                                            else:
-                                                attr_str = " ".join([f'{k}="{v}"' for k, v in custom_attrs.items()])
-                                                if attr_str:
-                                                    opt_desc = f'{opt_text[:40]} [{attr_str[:50]}]'
-                                                else:
-                                                    opt_desc = f'CLICK: strategy="text", args={{"text": "{opt_text[:35]}"}} → вариант поиска'
-                                            option_texts.append(opt_desc)
-                                    except:
-                                        pass
-                                
-                                if option_texts:
-                                    hints.append(f'')
-                                    hints.append(f'⭐️ РЕЗУЛЬТАТЫ ПОИСКА (нажми на один из них):')
-                                    for opt_text in option_texts:
-
-                                        hints.append(f'    • {opt_text}')
-                        except:
-                            pass
-                except:
-                    pass
-            
-            # ========== 6️⃣ Проверить MODAL окна с опциями ==========
-            modal_found = False
-            
-            # Способ 1: Ищем по role=dialog (стандартные модали)
-            try:
-                dialogs = await self.page.get_by_role("dialog").all()
-                for dialog in dialogs:
-                    try:
-                        is_visible = await dialog.is_visible()
-                        if is_visible:
-                            modal_found = True
-                            # Используем Playwright методы для поиска элементов ВНУТРИ диалога
-                            # Это найдет ALL кнопки независимо от тега (<button>, div[role='button'], etc)
-                            dialog_buttons = await dialog.get_by_role("button").all()
-                            dialog_options = await dialog.get_by_role("option").all()
-                            all_elements = dialog_buttons + dialog_options
-                            
-                            if all_elements:
-                                hints.append(f'⚠️  MODAL DIALOG ОТКРЫТА: {len(all_elements)} выбираемых элементов')
-                                hints.append(f'   ⚠️  ВАЖНО: Выбери параметры ДО нажатия финальной кнопки!')
-                                for elem in all_elements[:15]:
-                                    try:
-                                        elem_text = await elem.text_content()
-                                        elem_text = elem_text.strip() if elem_text else ""
-                                        
-                                        # Собрать все атрибуты
-                                        custom_attrs = await elem.evaluate("""elem => {
-                                            let attrs = {};
-                                            for (let attr of elem.attributes) {
-                                                if (attr.name.startsWith('data-') || attr.name === 'value' || attr.name === 'id') {
-                                                    attrs[attr.name] = attr.value;
-                                                }
-                                            }
-                                            return attrs;
-                                        }""")
-                                        if elem_text or custom_attrs:
-                                            attr_str = " ".join([f'{k}="{v}"' for k, v in custom_attrs.items()])
-                                            if attr_str:
-                                                hints.append(f'  • {elem_text[:40]} [{attr_str[:50]}]')
-                                            else:
-                                                hints.append(f'  • {elem_text[:50]}')
-                                    except:
-                                        pass
-                    except:
-                        pass
-            except:
-                pass
-            
-            # Способ 2: Ищем по CSS-классам popup/modal (как Dodo Pizza)
-            # Используем evaluate + Playwright для правильного поиска
-            if not modal_found:
-                try:
-                    # Сначала найдем контейнеры с popup/modal в классах через JavaScript
-                    popup_elements = await self.page.evaluate("""
-                        () => {
-                            let popups = [];
-                            // Ищем элементы WHERE class содержит 'popup' ИЛИ 'modal'
-                            let matching = document.querySelectorAll('[class*="popup"], [class*="modal"]');
-                            for (let elem of matching) {
-                                // Проверяем видимость через JavaScript
-                                let rect = elem.getBoundingClientRect();
-                                let isVisible = rect.width > 0 && rect.height > 0 && window.getComputedStyle(elem).display !== 'none';
-                                if (isVisible) {
-                                    popups.push({
-                                        html: elem.outerHTML.substring(0, 100),
-                                        class: elem.getAttribute('class')
-                                    });
-                                }
-                            }
-                            return popups;
-                        }
-                    """)
-                    
-                    # Если нашли popup элементы, работаем с ними через Playwright
-                    if popup_elements:
-                        # Используем get_by_role чтобы найти кнопки в ВИДИМОМ popup контейнере
-                        # Сначала проверяем что есть видимые элементы с классами popup/modal
-                        
-                        # Ищем ВСЕ видимые кнопки на странице которые находятся внутри popup
-                        all_buttons = await self.page.get_by_role("button").all()
-                        all_options = await self.page.get_by_role("option").all()
-                        all_menuitems = await self.page.get_by_role("menuitem").all()
-                        
-                        all_elements = all_buttons + all_options + all_menuitems
-                        
-                        # Фильтруем элементы которые видимы И находятся внутри popup
-                        popup_inner_elements = []
-                        for elem in all_elements:
-                            try:
-                                is_visible = await elem.is_visible()
-                                if is_visible:
-                                    # Проверяем что элемент находится внутри popup контейнера
-                                    is_in_popup = await elem.evaluate("""
-                                        elem => {
-                                            // Проверяем все родители элемента
-                                            let parent = elem.parentElement;
-                                            while (parent) {
-                                                let cls = parent.getAttribute('class') || '';
-                                                if (cls.includes('popup') || cls.includes('modal')) {
-                                                    return true;
-                                                }
-                                                parent = parent.parentElement;
-                                            }
-                                            return false;
-                                        }
-                                    """)
-                                    if is_in_popup:
-                                        popup_inner_elements.append(elem)
-                            except:
-                                pass
-                        
-                        # Если нашли достаточно элементов в popup (больше чем просто кнопка закрытия)
-                        if popup_inner_elements and len(popup_inner_elements) > 2:
-                            modal_found = True
-                            hints.append(f'')
-                            hints.append(f'⚠️  МОДАЛЬНОЕ ОКНО ОТКРЫТО: {len(popup_inner_elements)} интерактивных элементов')
-                            hints.append(f'   ⚠️  ВАЖНО: Выбери ВСЕ параметры (размер/тип/добавки) ДО финальной кнопки!')
-                            hints.append(f'   Элементы в модали:')
-                            
-                            for elem in popup_inner_elements[:20]:
-                                try:
-                                    elem_text = await elem.text_content()
-                                    elem_text = elem_text.strip() if elem_text else ""
-                                    
-                                    # Собрать все атрибуты
-                                    custom_attrs = await elem.evaluate("""elem => {
-                                        let attrs = {};
-                                        for (let attr of elem.attributes) {
-                                            if (attr.name.startsWith('data-') || attr.name === 'id' || attr.name === 'class' || attr.name === 'onclick') {
-                                                attrs[attr.name] = attr.value;
-                                            }
-                                        }
-                                        return attrs;
-                                    }""")
-                                    
-                                    if elem_text or custom_attrs:
-                                        attr_str = " ".join([f'{k}="{v}"' for k, v in custom_attrs.items()])
-                                        if attr_str:
-                                            hints.append(f'      • {elem_text[:35]} | {attr_str[:55]}')
-                                        else:
-                                            hints.append(f'      • {elem_text[:50]}')
-                                except:
-                                    pass
-                except:
-                    pass
-            
-            # ========== 6.5️⃣ КНОПКИ ИЗ МОДАЛЬНОГО ОКНА ==========
-            # Если модальное окно открыто, ищем ВСЕ ВОЗМОЖНЫЕ КНОПКИ внутри него
-            if modal_window_open:
-                try:
-                    logger.debug("🔍 Ищу ВСЕ кнопки ВНУТРИ модального окна...")
-                    modal_locator = await self._get_modal_locator()
-                    
-                    if modal_locator:
-                        # 🎯 Ищем все возможные кнопки: <button>, [role="button"], <a>, submit input и т.д.
-                        buttons_locator = modal_locator.locator('button, [role="button"], a[href], input[type="submit"], input[type="button"]')
-                        
-                        try:
-                            # Ждем появления хотя бы одной кнопки (на случай анимации)
-                            await buttons_locator.first.wait_for(state="visible", timeout=2000)
-                        except:
-                            # Если кнопок нет - продолжаем
-                            pass
-                        
-                        # Получаем все найденные кнопки
-                        all_buttons = await buttons_locator.all()
-                        logger.debug(f"  📊 Всего найдено элементов-кнопок: {len(all_buttons)}")
-                        
-                        if all_buttons:
-                            # 🎯 ОПРЕДЕЛЯЕМ: Это список выбора или отдельные кнопки?
-                            # Если более 3 похожих кнопок - вероятно это селектор (город, вариант, и т.д.)
-                            is_selection_list = len(all_buttons) > 3
-                            
-                            if is_selection_list:
-                                hints.append("")
-                                hints.append("⚠️  СПИСОК ДЛЯ ВЫБОРА (выбери ОДИН элемент, не пиши текст):")
-                            else:
-                                hints.append("")
-                                hints.append("🔴 КНОПКИ И ССЫЛКИ В МОДАЛЬНОМ ОКНЕ:")
-                            
-                            button_count = 0
-                            for idx, btn in enumerate(all_buttons):
-                                try:
-                                    # Проверяем видимость
-                                    is_visible = await btn.is_visible()
-                                    if not is_visible:
-                                        logger.debug(f"    [{idx}] ⚠️ Невидима - пропускаем")
-                                        continue
-                                    
-                                    # Получаем текст кнопки
-                                    btn_text = (await btn.inner_text()).strip()
-                                    
-                                    # Если текста нет - пробуем aria-label или value
-                                    if not btn_text:
-                                        btn_text = await btn.get_attribute("aria-label") or ""
-                                        btn_text = btn_text.strip() if btn_text else ""
-                                    
-                                    # Если всё ещё нет текста - пробуем value для submit кнопок
-                                    if not btn_text:
-                                        btn_text = await btn.get_attribute("value") or ""
-                                        btn_text = btn_text.strip() if btn_text else ""
-                                    
-                                    # Если совсем нет текста - пропускаем
-                                    if not btn_text or len(btn_text) < 1:
-                                        logger.debug(f"    [{idx}] ⚠️ Нет текста - пропускаем")
-                                        continue
-                                    
-                                    button_count += 1
-                                    
-                                    # Логируем найденную кнопку
-                                    logger.debug(f"    ✅ [{button_count}] {btn_text[:50]}")
-                                    
-                                    # Формируем hint с текстом кнопки
-                                    hint_str = f'CLICK: strategy="text", args={{"text": "{btn_text[:60]}"}}'
-                                    hints.append(f'  ➡️  {hint_str}')
-                                    
-                                except Exception as btn_error:
-                                    logger.debug(f"    ⚠️ Ошибка обработки кнопки {idx}: {str(btn_error)[:40]}")
-                            
-                            if button_count == 0:
-                                logger.debug(f"  ⚠️ Видимых кнопок в модали не найдено (всего элементов: {len(all_buttons)})")
-                            else:
-                                logger.debug(f"  ✅ Добавлено в hints: {button_count} видимых кнопок")
-                        else:
-                            logger.debug(f"  ⚠️ Кнопки в модали не найдены")
-                            
-                except Exception as e:
-                    logger.debug(f"⚠️ Ошибка при поиске кнопок модали: {str(e)[:80]}")
+            records.extend(listbox_records)
+            records.extend(dialog_records)
+            records.extend(modal_button_records)
             
             # ========== 7️⃣ Специальная обработка SEARCH INPUT ==========
             if not modal_window_open:  # ТОЛЬКО если нет модального окна
-                try:
-                    search_input = await self.page.get_by_placeholder("search").first.is_visible()
-                    if search_input:
-                        hints.append('There is a search input field (placeholder="search")')
-                except:
-                    pass
+                # Уже посчитано в снимке вместе с остальными счётчиками
+                if snapshot["has_search_input"]:
+                    records.append(("search_input",))
             
             # ========== 8️⃣ Если hints пусты - это может означать динамический контент ==========
-            if not hints:
-                hints.append('Page content looks dynamic or dialog appears. Try scrolling or waiting.')
+            if not records:
+                records.append(("dynamic",))
+            
+            hints = [_HINT_FMT[kind].format(*args) for kind, *args in records]
             
             # ========== 📋 ЛОГИРОВАНИЕ: Показать все INPUT поля которые нашли ==========
             input_hints = [h for h in hints if "FILL:" in h or "INPUT FIELDS:" in h]
@@ -1064,142 +1047,215 @@ class PageAnalyzer:
             logger.error(f"Ошибка при получении подсказок: {str(e)}")
             return ["Page analysis failed, check browser console"]
     
-    async def _find_interactive_elements(self) -> List[InteractiveElement]:
-        """
-        ❌ DEPRECATED in v2: НЕ используется больше!
-        Оставлена только для backward compatibility.
+    async def _section_links(self, counts: Dict[str, int], modal_window_open: bool) -> List[Tuple[Any, ...]]:
+        """3️⃣ Ссылки основной страницы (только если нет модального окна)"""
+        records: List[Tuple[Any, ...]] = []
+        links_count = counts["links"]
+        if links_count == 0 or modal_window_open:
+            return records
         
-        v2 модель: 
-        - PageAnalyzer возвращает HINTS, не элементы
-        - ActionExecutor создаёт locator в момент действия
-        - Playwright проверяет actionability
-        """
-        return []  # v2: empty, используем search_hints вместо этого
+        try:
+            # "текст (контекст)" всех ссылок - одним evaluate_all; короткие и повторы отсеяны в JS
+            link_list = await self.page.locator(_LINK_SELECTOR).evaluate_all(_LINKS_JS)
+        except PWError:
+            link_list = []
 
-    async def _flatten_accessibility_tree(self, node: Dict[str, Any], depth: int = 0) -> List[Dict[str, Any]]:
-        """
-        ❌ УСТАРЕЛО: Больше не нужно, используем get_by_role() напрямую.
-        Оставляем для совместимости, но не используем.
-        """
-        nodes = []
-        if not node:
-            return nodes
-        if node.get('role'):
-            nodes.append(node)
-        if node.get('children'):
-            for child in node['children']:
-                nodes.extend(await self._flatten_accessibility_tree(child, depth + 1))
-        return nodes
+        if link_list:
+            records.append(("blank",))  # Empty line for readability
+            records.append(("links_header",))
+            for link_text in link_list:
+                records.append(("quoted_item", link_text))
+        else:
+            records.append(("links_untitled", links_count))
+        return records
+    
+    async def _section_listbox(self, counts: Dict[str, int], modal_window_open: bool) -> List[Tuple[Any, ...]]:
+        """5.5️⃣ LISTBOX (выпадающие меню) - только на основной странице"""
+        records: List[Tuple[Any, ...]] = []
+        if modal_window_open:
+            return records
+        
+        listbox_count = counts["listboxes"]
+        if listbox_count == 0:
+            return records
+        records.append(("listbox", listbox_count))
+        
+        # Попробать собрать опции - первые 15 одним evaluate_all
+        try:
+            options = await self.page.locator(_OPTION_SELECTOR).evaluate_all(_OPTIONS_JS)
+        except PWError:
+            return records
+        
+        option_texts = []
+        for opt in options:
+            opt_text = opt["text"]
+            custom_attrs = opt["attrs"]
+            
+            # Форматировать вывод с явным указанием стратегии КЛИКА (опции без текста отсеяны в JS)
+            # Если есть ID - покажи как кликать через ID
+            if 'id' in custom_attrs:
+                opt_desc = f'CLICK: strategy="id", args={{"id": "{custom_attrs["id"]}"}} → {opt_text[:35]}'
+            else:
+                attr_str = " ".join([f'{k}="{v}"' for k, v in custom_attrs.items()])
+                if attr_str:
+                    opt_desc = f'{opt_text} [{attr_str[:50]}]'
+                else:
+                    opt_desc = f'CLICK: strategy="text", args={{"text": "{opt_text[:35]}"}} → вариант поиска'
+            option_texts.append(opt_desc)
+        
+        if option_texts:
+            records.append(("blank",))
+            records.append(("options_header",))
+            for opt_text in option_texts:
+                records.append(("option", opt_text))
+        return records
+    
+    async def _section_dialogs(self, counts: Dict[str, int]) -> List[Tuple[Any, ...]]:
+        """6️⃣ MODAL окна с опциями: role=dialog, затем popup по CSS-классам"""
+        records: List[Tuple[Any, ...]] = []
+        modal_found = False
+
+        # Способ 1: Ищем по role=dialog (стандартные модали)
+        # Видимость и элементы ВНУТРИ каждого диалога - одним evaluate_all
+        # Нет видимых диалогов по снимку - не ходим в браузер вовсе
+        dialogs = []
+        if counts["dialogs"]:
+            try:
+                dialogs = await self._dialogs_locator.evaluate_all(_DIALOG_ITEMS_JS)
+            except PWError:
+                pass
+        for dialog in dialogs:
+            modal_found = True
+            if dialog["total"]:
+                records.append(("dialog_header", dialog["total"]))
+                records.append(("dialog_warning",))
+                for elem in dialog["items"]:
+                    # Пустые (ни текста, ни атрибутов) отсеяны в JS
+                    elem_text = elem["text"]
+                    custom_attrs = elem["attrs"]
+                    attr_str = " ".join([f'{k}="{v}"' for k, v in custom_attrs.items()])
+                    if attr_str:
+                        records.append(("dialog_item_attrs", elem_text[:40], attr_str[:50]))
+                    else:
+                        records.append(("dialog_item", elem_text))
+        
+        # Способ 2: Ищем по CSS-классам popup/modal (как Dodo Pizza)
+        # Контейнеры, видимость и принадлежность элементов popup - всё в одном evaluate
+        if modal_found:
+            return records
+        try:
+            popup = await self.page.evaluate(_POPUP_ITEMS_JS)
+        except PWError:
+            return records
+        
+        # Если нашли достаточно элементов в popup (больше чем просто кнопка закрытия)
+        if popup and popup["total"] > 2:
+            records.append(("blank",))
+            records.append(("popup_header", popup["total"]))
+            records.append(("popup_warning",))
+            records.append(("popup_items_header",))
+            
+            for elem in popup["items"]:
+                # Пустые (ни текста, ни атрибутов) отсеяны в JS
+                elem_text = elem["text"]
+                custom_attrs = elem["attrs"]
+                attr_str = " ".join([f'{k}="{v}"' for k, v in custom_attrs.items()])
+                if attr_str:
+                    records.append(("popup_item_attrs", elem_text[:35], attr_str[:55]))
+                else:
+                    records.append(("popup_item", elem_text))
+        return records
+    
+    async def _section_modal_buttons(self, modal_window_open: bool) -> List[Tuple[Any, ...]]:
+        """6.5️⃣ Все возможные кнопки внутри открытого модального окна"""
+        records: List[Tuple[Any, ...]] = []
+        if not modal_window_open:
+            return records
+        
+        try:
+            logger.debug("🔍 Ищу ВСЕ кнопки ВНУТРИ модального окна...")
+            modal_locator = await self._get_modal_locator()
+
+            if modal_locator:
+                # 🎯 Ищем все возможные кнопки: <button>, [role="button"], <a>, submit input и т.д.
+                buttons_locator = modal_locator.locator('button, [role="button"], a[href], input[type="submit"], input[type="button"]')
+
+                try:
+                    # Ждем появления хотя бы одной кнопки (на случай анимации)
+                    await buttons_locator.first.wait_for(state="visible", timeout=2000)
+                except PWError:  # в т.ч. playwright TimeoutError
+                    # Если кнопок нет - продолжаем
+                    pass
 
+                # Видимость и текст всех кнопок - одним evaluate_all
+                modal_buttons = await buttons_locator.evaluate_all(_MODAL_BUTTONS_JS)
+                logger.debug(f"  📊 Всего найдено элементов-кнопок: {modal_buttons['total']}")
+
+                if modal_buttons["total"]:
+                    # 🎯 ОПРЕДЕЛЯЕМ: Это список выбора или отдельные кнопки?
+                    # Если более 3 похожих кнопок - вероятно это селектор (город, вариант, и т.д.)
+                    is_selection_list = modal_buttons["total"] > 3
+
+                    if is_selection_list:
+                        records.append(("blank",))
+                        records.append(("selection_header",))
+                    else:
+                        records.append(("blank",))
+                        records.append(("modal_buttons_header",))
+
+                    button_count = 0
+                    for btn_text in modal_buttons["texts"]:
+                        button_count += 1
+
+                        # Логируем найденную кнопку
+                        logger.debug(f"    ✅ [{button_count}] {btn_text[:50]}")
+
+                        # Формируем hint с текстом кнопки
+                        records.append(("modal_button", btn_text))
+
+                    if button_count == 0:
+                        logger.debug(f"  ⚠️ Видимых кнопок в модали не найдено (всего элементов: {modal_buttons['total']})")
+                    else:
+                        logger.debug(f"  ✅ Добавлено в hints: {button_count} видимых кнопок")
+                else:
+                    logger.debug(f"  ⚠️ Кнопки в модали не найдены")
+
+        except Exception as e:
+            if logger.debug_enabled():
+                logger.debug(f"⚠️ Ошибка при поиске кнопок модали: {str(e)[:80]}")
+        return records
+    
     def _map_accessibility_role_to_type(self, role: str) -> str:
         """
         Маппинг ARIA роли в тип элемента для InteractiveElement.
         """
-        role_lower = role.lower()
-        
-        if role_lower in ['button', 'menuitem', 'menuitemcheckbox', 'menuitemradio', 'tab', 'treeitem']:
-            return 'button'
-        elif role_lower in ['link', 'doc-link']:
-            return 'link'
-        elif role_lower in ['textbox', 'searchbox']:
-            return 'input'
-        elif role_lower in ['checkbox']:
-            return 'checkbox'
-        elif role_lower in ['radio']:
-            return 'radio'
-        elif role_lower in ['combobox', 'listbox', 'select']:
-            return 'select'
-        elif role_lower in ['option']:
-            return 'option'
-        else:
-            return role
-
-    async def _get_headings(self) -> List[Dict[str, str]]:
-        """Extract all headings from page"""
-        try:
-            headings = await self.page.evaluate("""
-                () => {
-                    return Array.from(document.querySelectorAll('h1, h2, h3, h4, h5, h6'))
-                        .map(h => ({
-                            level: h.tagName.toLowerCase(),
-                            text: h.innerText.trim()
-                        }))
-                        .filter(h => h.text.length > 0);
-                }
-            """)
-            return headings
-        except:
-            return []
+        return _ROLE_TO_TYPE.get(role.lower(), role)
 
     async def _identify_key_form_fields(self) -> List[Dict[str, Any]]:
         """Identify KEY form fields (не все, только главные) для LLM"""
+        fields = []
+        
+        # Найти textbox/searchbox по CSS-приближению ролей (без движка get_by_role)
+        # label и значение всех полей обеих ролей - одним page.evaluate
         try:
-            fields = []
-            
-            # Найти inputs используя Playwright get_by_role вместо CSS селектора
-            textboxes = await self.page.get_by_role("textbox").all()
-            searchboxes = await self.page.get_by_role("searchbox").all()
-            all_inputs = textboxes + searchboxes
-            
-            for inp in all_inputs[:10]:  # Maximum 10 fields
-                try:
-                    # Получить label информацию используя evaluate (JavaScript)
-                    label_info = await inp.evaluate("""
-                        elem => {
-                            let label_text = '';
-                            
-                            // Check for associated label via 'for' attribute
-                            if (elem.id) {
-                                let associated_label = document.querySelector(`label[for="${elem.id}"]`);
-                                if (associated_label) {
-                                    label_text = associated_label.innerText.trim();
-                                }
-                            }
-                            
-                            // Check for parent label
-                            if (!label_text) {
-                                let parent_label = elem.closest('label');
-                                if (parent_label) {
-                                    label_text = parent_label.innerText.trim();
-                                }
-                            }
-                            
-                            // Use aria-label
-                            if (!label_text) {
-                                label_text = elem.getAttribute('aria-label') || '';
-                            }
-                            
-                            // Use placeholder as fallback
-                            if (!label_text) {
-                                label_text = elem.getAttribute('placeholder') || '';
-                            }
-                            
-                            return {
-                                label: label_text.substring(0, 50),
-                                placeholder: elem.getAttribute('placeholder') || '',
-                                id: elem.getAttribute('id') || ''
-                            };
-                        }
-                    """)
-                    
-                    # Get input value using Playwright method
-                    input_value = await inp.input_value()
-                    
-                    label_text = label_info.get('label', '')
-                    if label_text:
-                        fields.append({
-                            "type": "input_field",
-                            "label": label_text.strip()[:50],
-                            "value": input_value or "",
-                            "hint": f'Fill field "{label_text.strip()[:30]}"' + 
-                                   (f' currently: "{input_value.strip()[:30]}"' if input_value else "")
-                        })
-                except:
-                    pass
-            
+            all_inputs = await self.page.evaluate(_FORM_FIELDS_JS)
+        except PWError:
             return fields
-        except:
-            return []
+        
+        for inp in all_inputs[:10]:  # Maximum 10 fields
+            label_text = inp['label']
+            input_value = inp['value']
+            if label_text:
+                label_text = label_text.strip()  # один strip на поле, дальше только срезы
+                fields.append({
+                    "type": "input_field",
+                    "label": label_text[:50],
+                    "value": input_value or "",
+                    "hint": f'Fill field "{label_text[:30]}"' + 
+                           (f' currently: "{input_value.strip()[:30]}"' if input_value else "")
+                })
+        
+        return fields
 
     
     async def _detect_modals(self, analysis: PageAnalysis) -> None:
@@ -1220,88 +1276,24 @@ class PageAnalyzer:
         try:
             # ========== МЕТОД 1: Поиск по ARIA role (САМЫЙ НАДЕЖНЫЙ) ==========
             # role="dialog" или role="alertdialog" - это явное указание что это модальное окно
-            try:
-                dialogs = await self.page.locator('[role="dialog"], [role="alertdialog"]').all()
-                
-                for dialog in dialogs:
-                    try:
-                        # Проверить видимость
-                        is_visible = await dialog.is_visible()
-                        if not is_visible:
-                            continue
-                        
-                        # Проверить что диалог имеет достаточную высоту (реальное модальное окно)
-                        bbox = await dialog.bounding_box()
-                        if not bbox or bbox['height'] < 150:  # Слишком маленькое = не модаль
-                            continue
-                        
-                        # Это реальное модальное окно!
-                        logger.analysis("🚨 Обнаружено модальное окно (role='dialog')")
-                        analysis.modal_open = True
-                        
-                        modal_text = await dialog.inner_text()
-                        analysis.modal_text = modal_text
-                        logger.analysis(f"📋 Текст модального окна: {analysis.modal_text[:100]}")
-                        
-                        # Попытаться найти стратегию закрытия
-                        await self._find_modal_close_strategy(analysis, dialog)
-                        return
-                    except Exception as e:
-                        logger.debug(f"  ⚠️ Ошибка при обработке диалога: {str(e)[:50]}")
-                        continue
-            except Exception as e:
-                logger.debug(f"  ⚠️ Ошибка МЕТОДА 1: {str(e)[:50]}")
-                pass
-            
             # ========== МЕТОД 2: По CSS-селекторам (УНИВЕРСАЛЬНЫЙ ПУТЬ) ==========
-            # Если сайт старый или не следует стандартам доступности
-            # Ищем по характерным классам: modal, popup, dialog
-            # Проверяем видимость и что это действительно открыто
-            try:
-                logger.debug("🔍 МЕТОД 2: Поиск по CSS-селекторам (modal/popup/dialog)...")
-                
-                # Селектор перебирает частые названия классов и атрибутов
-                modal_selector = 'div[class*="modal"], div[class*="popup"], [role="dialog"], .fade.show'
-                modal_locator = self.page.locator(modal_selector)
-                count = await modal_locator.count()
-                
-                if count > 0:
-                    logger.debug(f"  ✅ Найдено {count} потенциальных модальных окон по CSS селектору")
-                    # Берем ПОСЛЕДНЕЕ окно (обычно оно поверх всех)
-                    modal_elem = modal_locator.last
-                    
-                    # Проверяем что это действительно видимое и открытое окно
-                    try:
-                        is_visible = await modal_elem.is_visible()
-                        if not is_visible:
-                            logger.debug("  ⚠️ Элемент не видим по is_visible() - пропускаем")
-                            raise Exception("Not visible")
-                        
-                        # Проверяем размер
-                        bbox = await modal_elem.bounding_box()
-                        if not bbox or bbox['height'] < 150:
-                            logger.debug(f"  ⚠️ Элемент слишком маленький ({bbox['height'] if bbox else 0} px) - пропускаем")
-                            raise Exception("Too small")
-                        
-                        # Это реальное модальное окно!
-                        logger.analysis("🚨 Обнаружено модальное окно по CSS классам")
-                        analysis.modal_open = True
-                        
-                        modal_text = await modal_elem.inner_text()
-                        analysis.modal_text = modal_text
-                        logger.analysis(f"📋 Текст модального окна: {analysis.modal_text[:100]}")
-                        
-                        # Попытаться найти стратегию закрытия
-                        await self._find_modal_close_strategy(analysis, modal_elem)
-                        return
-                    except Exception as e:
-                        logger.debug(f"  ⚠️ Ошибка при обработке CSS элемента: {str(e)[:50]}")
-                        pass
+            # Если сайт старый или не следует стандартам доступности - ищем по классам modal, popup, dialog
+            # Оба метода, видимость, размер и кнопки окна - в одном _MODAL_PROBE_JS
+            probe = await self._probe_modal()
+            
+            if probe:
+                # Это реальное модальное окно!
+                if probe["method"] == "aria":
+                    logger.analysis("🚨 Обнаружено модальное окно (role='dialog')")
                 else:
-                    logger.debug(f"  ℹ️ Модальные окна по CSS селектору не найдены")
-            except Exception as e:
-                logger.debug(f"  ⚠️ Ошибка МЕТОДА 2: {str(e)[:50]}")
-                pass
+                    logger.analysis("🚨 Обнаружено модальное окно по CSS классам")
+                analysis.modal_open = True
+                analysis.modal_text = probe["text"]
+                logger.analysis(f"📋 Текст модального окна: {analysis.modal_text[:100]}")
+                
+                # Попытаться найти стратегию закрытия - по уже собранным кнопкам, без новых запросов
+                await self._find_modal_close_strategy(analysis, probe["buttons"])
+                return
             
             # ========== ФИНАЛ: Модального окна не найдено ==========
             # Если оба метода не сработали - модального окна нет
@@ -1309,16 +1301,27 @@ class PageAnalyzer:
             logger.debug("✓ Видимое модальное окно не обнаружено")
         
         except Exception as e:
-            logger.debug(f"Ошибка при обнаружении модальных окон: {e}")
+            if logger.debug_enabled():
+                logger.debug(f"Ошибка при обнаружении модальных окон: {e}")
             analysis.modal_open = False
 
-    async def _find_modal_close_strategy(self, analysis: PageAnalysis, modal_locator) -> None:
+    async def _probe_modal(self) -> Optional[Dict[str, Any]]:
+        """
+        Состояние модального окна за один evaluate: {method, text, buttons: [{text, aria_label}]} или None.
+        """
+        try:
+            return await self.page.evaluate(_MODAL_PROBE_JS)
+        except PWError as e:
+            if logger.debug_enabled():
+                logger.debug(f"  ⚠️ Ошибка при поиске модального окна: {str(e)[:50]}")
+            return None
+
+    async def _find_modal_close_strategy(self, analysis: PageAnalysis, buttons: List[Dict[str, str]]) -> None:
         """
         🔍 Найти кнопку или механизм для закрытия модального окна.
         
-        ВАЖНО: Ищем элементы ТОЛЬКО ВНУТРИ видимой модали!
-        Используем modal_locator.get_by_role() вместо page.get_by_role()
-        чтобы найти элементы исключительно внутри этой модали.
+        ВАЖНО: buttons - кнопки ТОЛЬКО ВНУТРИ видимой модали (текст и aria-label),
+        собранные _probe_modal вместе с самим окном.
         
         Приоритет:
         1. Кнопка "Close" с иконкой X или текстом "close"
@@ -1329,100 +1332,71 @@ class PageAnalyzer:
         try:
             # ========== СТРАТЕГИЯ 1: Ищем кнопку "Close" / X ==========
             # Ищем по aria-label или текстом
-            # ВАЖНО: Используем modal_locator.get_by_role() чтобы искать ТОЛЬКО внутри модали!
-            try:
-                logger.debug("  🔍 Ищем кнопку закрытия (X или 'Close')...")
-                close_buttons = await modal_locator.get_by_role("button").all()
+            logger.debug("  🔍 Ищем кнопку закрытия (X или 'Close')...")
+            for btn in buttons:
+                button_text = btn["text"]
+                aria_label = btn["aria_label"]
                 
-                for btn in close_buttons:
-                    try:
-                        button_text = (await btn.inner_text()).strip()
-                        aria_label = await btn.get_attribute("aria-label")
-                        
-                        # Проверяем текст и aria-label на наличие "close"
-                        is_close_button = (
-                            button_text.lower() in ["close", "x", "✕", "×"] or
-                            (aria_label and ("close" in aria_label.lower() or "закрыть" in aria_label.lower()))
-                        )
-                        
-                        if is_close_button:
-                            logger.analysis(f"✅ Найдена кнопка закрытия: '{button_text or aria_label}'")
-                            close_element = InteractiveElement(
-                                element_id="modal_close",
-                                element_type="button",
-                                text=button_text or (aria_label or "Close"),
-                                selector="[role='button']",
-                                description="Modal close button"
-                            )
-                            close_element.locator_strategy = "text"
-                            close_element.locator_args = {"text": button_text or aria_label}
-                            close_element.can_click = True
-                            analysis.modal_close_element = close_element
-                            return
-                    except Exception as e:
-                        logger.debug(f"    ⚠️ Ошибка при проверке кнопки: {str(e)[:40]}")
-                        pass
-            except Exception as e:
-                logger.debug(f"  ⚠️ Ошибка при поиске кнопок Close: {str(e)[:50]}")
-                pass
+                # Проверяем текст и aria-label на наличие "close"
+                aria_lower = aria_label.lower()
+                is_close_button = (
+                    button_text.lower() in _CLOSE_EXACT or
+                    any(token in aria_lower for token in _CLOSE_SUBSTR)
+                )
+                
+                if is_close_button:
+                    logger.analysis(f"✅ Найдена кнопка закрытия: '{button_text or aria_label}'")
+                    close_element = InteractiveElement(
+                        element_id="modal_close",
+                        element_type="button",
+                        text=button_text or (aria_label or "Close"),
+                        selector="[role='button']",
+                        description="Modal close button"
+                    )
+                    close_element.locator_strategy = _STRATS["text"]
+                    close_element.locator_args = {"text": button_text or aria_label}
+                    close_element.can_click = True
+                    analysis.modal_close_element = close_element
+                    return
             
             # ========== СТРАТЕГИЯ 2: Кнопки Cancel/No/Отмена ==========
             # Ищем кнопки с типичными текстами закрытия/отмены
-            try:
-                logger.debug("  🔍 Ищем кнопку Cancel/Отмена/No...")
-                action_button_texts = [
-                    "Cancel", "cancel", "CANCEL",
-                    "No", "no", "NO",
-                    "Отмена", "отмена",
-                    "Закрыть", "закрыть",
-                    "Нет", "нет"
-                ]
-                
-                buttons = await modal_locator.get_by_role("button").all()
-                for btn in buttons:
-                    btn_text = (await btn.inner_text()).strip()
-                    if btn_text in action_button_texts:
-                        logger.analysis(f"✅ Найдена кнопка действия: '{btn_text}'")
-                        close_element = InteractiveElement(
-                            element_id="modal_close",
-                            element_type="button",
-                            text=btn_text,
-                            selector="button",
-                            description=f"Modal action button: {btn_text}"
-                        )
-                        close_element.locator_strategy = "text"
-                        close_element.locator_args = {"text": btn_text}
-                        close_element.can_click = True
-                        analysis.modal_close_element = close_element
-                        return
-            except Exception as e:
-                logger.debug(f"  ⚠️ Ошибка при поиске кнопок Cancel: {str(e)[:50]}")
-                pass
+            logger.debug("  🔍 Ищем кнопку Cancel/Отмена/No...")
+            for btn in buttons:
+                btn_text = btn["text"]
+                if btn_text.lower() in _MODAL_ACTION_TEXTS:
+                    logger.analysis(f"✅ Найдена кнопка действия: '{btn_text}'")
+                    close_element = InteractiveElement(
+                        element_id="modal_close",
+                        element_type="button",
+                        text=btn_text,
+                        selector="button",
+                        description=f"Modal action button: {btn_text}"
+                    )
+                    close_element.locator_strategy = _STRATS["text"]
+                    close_element.locator_args = {"text": btn_text}
+                    close_element.can_click = True
+                    analysis.modal_close_element = close_element
+                    return
             
             # ========== СТРАТЕГИЯ 3: Если есть кнопки - берем ПЕРВУЮ ==========
-            # ВАЖНО: Используем modal_locator.get_by_role() чтобы искать ТОЛЬКО внутри модали
-            try:
-                logger.debug("  🔍 Будет использована ПЕРВАЯ кнопка в модали...")
-                buttons = await modal_locator.get_by_role("button").all()
-                if buttons:
-                    first_btn_text = (await buttons[0].inner_text()).strip()
-                    if first_btn_text:
-                        logger.analysis(f"✅ Будет использована первая кнопка: '{first_btn_text[:30]}'")
-                        close_element = InteractiveElement(
-                            element_id="modal_close",
-                            element_type="button",
-                            text=first_btn_text,
-                            selector="button:first-of-type",
-                            description="First modal button"
-                        )
-                        close_element.locator_strategy = "text"
-                        close_element.locator_args = {"text": first_btn_text}
-                        close_element.can_click = True
-                        analysis.modal_close_element = close_element
-                        return
-            except Exception as e:
-                logger.debug(f"  ⚠️ Ошибка при поиске первой кнопки: {str(e)[:50]}")
-                pass
+            logger.debug("  🔍 Будет использована ПЕРВАЯ кнопка в модали...")
+            if buttons:
+                first_btn_text = buttons[0]["text"]
+                if first_btn_text:
+                    logger.analysis(f"✅ Будет использована первая кнопка: '{first_btn_text[:30]}'")
+                    close_element = InteractiveElement(
+                        element_id="modal_close",
+                        element_type="button",
+                        text=first_btn_text,
+                        selector="button:first-of-type",
+                        description="First modal button"
+                    )
+                    close_element.locator_strategy = _STRATS["text"]
+                    close_element.locator_args = {"text": first_btn_text}
+                    close_element.can_click = True
+                    analysis.modal_close_element = close_element
+                    return
             
             # ========== СТРАТЕГИЯ 4: ESC ключ как fallback ==========
             logger.analysis("⚠️ Не найдена кнопка закрытия, будет использован ESC ключ")
@@ -1437,28 +1411,38 @@ class PageAnalyzer:
             analysis.modal_close_element = close_element
             
         except Exception as e:
-            logger.debug(f"Ошибка при поиске стратегии закрытия модали: {e}")
+            if logger.debug_enabled():
+                logger.debug(f"Ошибка при поиске стратегии закрытия модали: {e}")
     
     async def _log_page_stats(self, analysis: PageAnalysis):
         """
         Логировать статистику страницы: размер, количество элементов, текста и т.д.
         """
+        # Log video error if detected
+        if analysis.video_error:
+            logger.warning(f"🎥 VIDEO ERROR DETECTED: {analysis.video_error}")
+        
+        # Остальное идёт только в logger.dom - при выключенном DOM-логе страницу не трогаем вовсе
+        if not logger.dom_enabled():
+            return
+        
         try:
             # Get page size via JavaScript
             page_size = await self.page.evaluate("""
                 () => {
-                    // Approximate page size by counting DOM nodes and content
-                    const html = document.documentElement.outerHTML;
+                    // Approximate page size: длина innerHTML (UTF-16) без Blob и UTF-8 кодирования,
+                    // число элементов - .length живой коллекции без статического NodeList
                     return {
-                        html_bytes: new Blob([html]).size,
-                        elements_count: document.querySelectorAll('*').length,
+                        html_bytes: document.documentElement.innerHTML.length,
+                        elements_count: document.getElementsByTagName('*').length,
                     };
                 }
             """)
             
-            # Calculate content size
-            text_size = len(analysis.main_text.encode('utf-8'))
-            hints_size = len(str(analysis.search_hints).encode('utf-8'))
+            # Calculate content size (приблизительно - только для лога):
+            # main_text ограничен _MAIN_TEXT_BUDGET, у подсказок суммируем строки без repr() всего списка
+            text_size = len(analysis.main_text.encode('utf-8', 'replace'))
+            hints_size = sum(len(h.encode('utf-8', 'replace')) for h in analysis.search_hints)
             
             total_collected = text_size + hints_size
             html_mb = page_size['html_bytes'] / (1024 * 1024)
@@ -1468,9 +1452,6 @@ class PageAnalyzer:
             logger.dom(f"Информация: {collected_mb:.2f} МБ (текст: {text_size / 1024:.1f} КБ + hints: {hints_size / 1024:.1f} КБ)")
             logger.dom(f"Элементов: {page_size['elements_count']} | Подсказок: {len(analysis.search_hints)}")
             
-            # Log video error if detected
-            if analysis.video_error:
-                logger.warning(f"🎥 VIDEO ERROR DETECTED: {analysis.video_error}")
-            
         except Exception as e:
-            logger.debug(f"Ошибка при сборе статистики: {e}")
\ No newline at end of file
+            if logger.debug_enabled():
+                logger.debug(f"Ошибка при сборе статистики: {e}")
\ No newline at end of file